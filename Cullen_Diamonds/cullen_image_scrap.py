@@ -1,60 +1,51 @@
+import hashlib
 import os
 import re
-import time
-from io import BytesIO
+import sys
+from functools import partial
+from urllib.parse import urlparse
 
-import requests
-from PIL import Image
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
-from webdriver_manager.chrome import ChromeDriverManager
+# Shared helpers live in scrap_common/ at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scrap_common import browser, capture, dom_snapshot, downloader, journal, readiness, resolver, sitemap, workers
 
 def safe_filename(name: str) -> str:
     """Sanitize a string to a safe filename/folder."""
     return re.sub(r"[^\w\-_. ]", "_", name).strip()[:60]
 
 def get_driver():
-    options = Options()
-    # Uncomment below for headless operation
-    # options.add_argument("--headless")
-    options.add_argument("--disable-blink-features=AutomationControlled")
-    options.add_argument("--disable-gpu")
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-    options.add_argument("--window-size=1400,1000")
-    driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
-    driver.set_page_load_timeout(60)
-    return driver
+    return browser.get_driver(page_load_timeout=60)
+
+# Everything extract_product_info_and_images reads, fetched in one round trip
+PRODUCT_QUERIES = {
+    # The product name is the <h1> inside <section class="details svelte-jiyox7">
+    "name": {"scope": "section.details.svelte-jiyox7", "scope_first": True, "css": "h1", "text": True},
+    "images": {"css": "img.content.image.svelte-zka3ay", "attrs": list(resolver.SRCSET_ATTRS + resolver.SRC_ATTRS)},
+}
 
 def extract_product_info_and_images(driver, product_url):
     print(f"Visiting: {product_url}")
-    driver.get(product_url)
-    time.sleep(2)  # or use WebDriverWait for more robust sites
-
-    # Extract the product name from <h1> inside <section class="details svelte-jiyox7">
-    product_name = None
-    try:
-        section = driver.find_element(By.CSS_SELECTOR, 'section.details.svelte-jiyox7')
-        h1 = section.find_element(By.TAG_NAME, 'h1')
-        product_name = h1.text.strip()
-    except Exception as e:
-        print(f"  ✘ Could not extract product name: {e}")
-        product_name = None
-
-    # Fall back to URL name if extraction fails
+    browser.load(driver, product_url)
+    readiness.wait_for_gallery(driver, "section.details.svelte-jiyox7", "img.content.image.svelte-zka3ay")
+
+    page = dom_snapshot.snapshot(driver, PRODUCT_QUERIES)
+
+    product_name = page["name"][0]["text"] if page["name"] else None
     if not product_name:
-        product_name = "product_" + str(int(time.time()))
+        print("  ✘ Could not extract product name")
+
+    # Fall back to URL name if extraction fails; unique per product, unlike a timestamp under parallel workers
+    if not product_name:
+        product_name = product_url.rstrip('/').rsplit('/', 1)[-1] or "product_" + hashlib.sha1(product_url.encode()).hexdigest()[:10]
 
     product_name = safe_filename(product_name)
 
-    # Extract main product images
+    # Extract main product images, at the srcset/CDN size we want rather than whatever src shows
     image_urls = []
     seen_src = set()
-    for img in driver.find_elements(By.CSS_SELECTOR, "img.content.image.svelte-zka3ay"):
-        src = img.get_attribute("src")
-        if src and not src.startswith("data:") and src not in seen_src:
+    for record in page["images"]:
+        src = resolver.image_url(record["attrs"], product_url)
+        if src and src not in seen_src:
             image_urls.append(src)
             seen_src.add(src)
     # Optionally: grab thumbnail images too by replicating logic here
@@ -62,21 +53,31 @@ def extract_product_info_and_images(driver, product_url):
     return product_name, image_urls
 
 def download_images(image_urls, folder_path):
-    os.makedirs(folder_path, exist_ok=True)
-    headers = {"User-Agent": "Mozilla/5.0"}
-    for idx, url in enumerate(image_urls, 1):
-        try:
-            r = requests.get(url, headers=headers, timeout=60)
-            r.raise_for_status()
-            img = Image.open(BytesIO(r.content))
-            save_path = os.path.join(folder_path, f"{idx}.jpg")
-            img.convert("RGB").save(save_path, "JPEG")
-            print(f"  ✔ Saved {save_path}")
-        except Exception as e:
-            print(f"  ✘ Failed to download {url} - {e}")
+    downloader.download_numbered(image_urls, folder_path)
 
-def main():
-    print("=== Product Media Downloader ===")
+# Sitemap pages that are not products: the home page, top-level category
+# pages and the store's editorial and account sections
+NON_PRODUCT_SECTIONS = re.compile(
+    r"(?:blog|blogs|journal|education|guides?|pages|about|contact|"
+    r"faq|reviews|showroom|appointments?|account|cart|checkout|search|policies)$",
+    re.IGNORECASE,
+)
+
+def is_product_page(url):
+    parts = [part for part in urlparse(url).path.split("/") if part]
+    return len(parts) >= 2 and not NON_PRODUCT_SECTIONS.match(parts[0])
+
+def process_product(driver, url, root_folder):
+    product_name, image_urls = extract_product_info_and_images(driver, url)
+    product_folder = os.path.join(root_folder, product_name)
+    print(f"  Saving images to: {product_folder}")
+    if not image_urls:
+        print("  ✘ No images found!")
+        return None
+    capture.harvest(driver, image_urls)
+    return partial(download_images, image_urls, product_folder)
+
+def ask_job():
     root_folder = input("Enter root download folder (default: 'products_media'): ").strip()
     if not root_folder:
         root_folder = "products_media"
@@ -91,29 +92,34 @@ def main():
             print("Please enter a valid http(s):// URL")
             continue
         product_urls.append(url)
+    return root_folder, product_urls
 
-    if not product_urls:
-        print("No product URLs entered. Exiting.")
+def main():
+    print("=== Product Media Downloader ===")
+    incremental = sitemap.command_line()
+    if incremental:
+        # Daily runs: only products whose sitemap <lastmod> changed since the last one
+        site_url, root_folder = incremental[0], incremental[1] or "products_media"
+        sitemap.run_changed(journal.Journal("cullen_diamonds_sitemap"), site_url, root_folder,
+                            partial(process_product, root_folder=root_folder), get_driver,
+                            product_filter=is_product_page)
         return
+    job_journal = journal.Journal("cullen_diamonds")
+    resumed = job_journal.offer_resume()
+    if resumed:
+        root_folder, product_urls = resumed
+        os.makedirs(root_folder, exist_ok=True)
+    else:
+        root_folder, product_urls = ask_job()
+        if not product_urls:
+            print("No product URLs entered. Exiting.")
+            return
+        job_journal.start(product_urls, root_folder)
 
-    driver = get_driver()
-    try:
-        for i, url in enumerate(product_urls, 1):
-            print(f"\n[{i}/{len(product_urls)}] Processing: {url}")
-            try:
-                product_name, image_urls = extract_product_info_and_images(driver, url)
-                product_folder = os.path.join(root_folder, product_name)
-                print(f"  Saving images to: {product_folder}")
-                if image_urls:
-                    download_images(image_urls, product_folder)
-                else:
-                    print("  ✘ No images found!")
-                time.sleep(1)
-            except Exception as e:
-                print(f"  ✘ Error processing {url}: {e}")
-    finally:
-        driver.quit()
-        print("\nAll done!")
+    # Page loads are paced per host by scrap_common/ratelimit.py
+    workers.run_pool(product_urls, partial(process_product, root_folder=root_folder), get_driver,
+                     journal=job_journal)
+    print("\nAll done!")
 
 if __name__ == "__main__":
     main()
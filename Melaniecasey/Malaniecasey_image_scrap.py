@@ -1,85 +1,55 @@
 import os
 import re
-import time
-from io import BytesIO
-from urllib.parse import urlparse, urljoin
-
-import requests
-from PIL import Image
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
-from selenium.common.exceptions import NoSuchElementException, TimeoutException
-from webdriver_manager.chrome import ChromeDriverManager
+import sys
+from functools import partial
+
+# Shared helpers live in scrap_common/ at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scrap_common import browser, capture, dom_snapshot, downloader, journal, readiness, resolver, shopify, sitemap, workers
 
 def safe_filename(name: str) -> str:
     return re.sub(r'[^\w\-_. ]', '_', name).strip()[:60]
 
+GALLERY_SELECTOR = "div.image-container.sliding-images.pinchable-container"
+# Slide indices and image attributes of the gallery, read in one round trip
+GALLERY_QUERIES = {
+    "gallery": {"css": GALLERY_SELECTOR},
+    "slides": {
+        "scope": GALLERY_SELECTOR,
+        "scope_first": True,
+        "css": "div[data-index]",
+        "attrs": ["data-index"],
+        "child": {"css": "img", "attrs": list(resolver.SRCSET_ATTRS + resolver.SRC_ATTRS)},
+    },
+}
+
 def get_driver():
-    options = Options()
-    # Uncomment below for headless mode if desired
-    # options.add_argument("--headless")
-    options.add_argument("--disable-blink-features=AutomationControlled")
-    options.add_argument("--disable-gpu")
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-    options.add_argument("--window-size=1400,1000")
-    driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
-    driver.set_page_load_timeout(90)
-    return driver
+    return browser.get_driver(page_load_timeout=90)
 
 def extract_gallery_images(driver, product_url):
     images = []
-    try:
-        gallery = driver.find_element(By.CSS_SELECTOR, "div.image-container.sliding-images.pinchable-container")
-        slides = gallery.find_elements(By.CSS_SELECTOR, "div[data-index]")
-    except NoSuchElementException:
+    page = dom_snapshot.snapshot(driver, GALLERY_QUERIES)
+    if not page["gallery"]:
         print("  ⚠️ Gallery container not found.")
         return []
 
     indexed_slides = []
-    for slide in slides:
+    for slide in page["slides"]:
         try:
-            idx = int(slide.get_attribute("data-index"))
+            idx = int(slide["attrs"]["data-index"])
             indexed_slides.append((idx, slide))
         except:
             continue
 
     indexed_slides.sort(key=lambda x: x[0])
     for _, slide in indexed_slides:
-        img_url = None
-        try:
-            img_elem = slide.find_element(By.TAG_NAME, "img")
-            srcset = img_elem.get_attribute("srcset")
-            if srcset:
-                # Select largest image in srcset by width
-                sources = []
-                for src in srcset.split(","):
-                    url_part = src.strip().split(" ")[0]
-                    width_match = re.search(r"(\d+)w", src)
-                    width = int(width_match.group(1)) if width_match else 0
-                    sources.append((width, url_part))
-                sources.sort(reverse=True, key=lambda x: x[0])
-                img_url = sources[0][1]
-            else:
-                for attr in ["data-src", "data-lazy-src", "src"]:
-                    val = img_elem.get_attribute(attr)
-                    if val:
-                        img_url = val
-                        break
-            if img_url:
-                img_url = img_url.strip()
-                if img_url.startswith("//"):
-                    img_url = "https:" + img_url
-                elif img_url.startswith("/"):
-                    parsed = urlparse(product_url)
-                    img_url = urljoin(f"{parsed.scheme}://{parsed.netloc}", img_url)
-
-                if not any(x in img_url.lower() for x in ['icon', 'sprite', 'placeholder', 'avatar']):
-                    images.append(img_url)
-        except NoSuchElementException:
+        img_attrs = slide["child"]["attrs"] if slide["child"] else None
+        if img_attrs is None:
             continue
+        # srcset candidate or CDN size closest to the configured width
+        img_url = resolver.image_url(img_attrs, product_url)
+        if img_url and not any(x in img_url.lower() for x in ['icon', 'sprite', 'placeholder', 'avatar']):
+            images.append(img_url)
 
     # Remove duplicates but keep order
     seen = set()
@@ -94,49 +64,44 @@ def extract_gallery_images(driver, product_url):
 # get_product_name is no longer needed, ignore/remove it
 
 def download_images(img_urls, folder_path):
-    os.makedirs(folder_path, exist_ok=True)
-    headers = {"User-Agent": "Mozilla/5.0"}
-    for idx, img_url in enumerate(img_urls, 1):
-        try:
-            r = requests.get(img_url, headers=headers, timeout=60)
-            r.raise_for_status()
-            img = Image.open(BytesIO(r.content))
-            save_path = os.path.join(folder_path, f"{idx}.jpg")
-            img.convert("RGB").save(save_path, "JPEG")
-            print(f"      ✔ Saved image {idx} at {save_path}")
-        except Exception as e:
-            print(f"      ✘ Failed to download {img_url}: {e}")
-
-def scrape_products(product_urls, save_root_folder):
-    driver = get_driver()
-    try:
-        for idx, url in enumerate(product_urls, 1):
-            print(f"\n[{idx}/{len(product_urls)}] Processing: {url}")
-            try:
-                driver.get(url)
-                time.sleep(3)  # Let page load fully
-            except TimeoutException:
-                print("    ⚠️ Timeout loading page, skipping...")
-                continue
-
-            # --- Use product name from URL slug ---
-            product_name = safe_filename(url.rstrip('/').split('/')[-1] or "Unknown_Product")
-            print(f"    Product name: {product_name}")
-
-            img_urls = extract_gallery_images(driver, url)
-            if not img_urls:
-                print("    ⚠️ No gallery images found, skipping...")
-                continue
-
-            save_folder = os.path.join(save_root_folder, product_name)
-            download_images(img_urls, save_folder)
-
-            time.sleep(2)  # polite delay between products
-    finally:
-        driver.quit()
-
-def main():
-    print("=== Product Images Batch Scraper ===")
+    downloader.download_numbered(img_urls, folder_path)
+
+def scrape_product_from_api(url, save_root_folder):
+    # Shopify /products/<handle>.js lists the gallery in order at full size
+    product = shopify.get_product(url)
+    if product is None:
+        return None
+    product_name = safe_filename(url.rstrip('/').split('/')[-1] or "Unknown_Product")
+    print(f"    Product name: {product_name} ({len(product[1])} images from Shopify API)")
+    save_folder = os.path.join(save_root_folder, product_name)
+    return partial(download_images, product[1], save_folder)
+
+
+def scrape_product(driver, url, save_root_folder):
+    # A page-load timeout propagates so the worker pool retries the product
+    browser.load(driver, url)
+    readiness.wait_for_gallery(driver, GALLERY_SELECTOR, GALLERY_SELECTOR + " div[data-index] img")
+
+    # --- Use product name from URL slug ---
+    product_name = safe_filename(url.rstrip('/').split('/')[-1] or "Unknown_Product")
+    print(f"    Product name: {product_name}")
+
+    img_urls = extract_gallery_images(driver, url)
+    if not img_urls:
+        print("    ⚠️ No gallery images found, skipping...")
+        return None
+
+    save_folder = os.path.join(save_root_folder, product_name)
+    capture.harvest(driver, img_urls)
+    return partial(download_images, img_urls, save_folder)
+
+def scrape_products(product_urls, save_root_folder, job_journal=None):
+    # Page loads are paced per host by scrap_common/ratelimit.py
+    workers.run_pool(product_urls, partial(scrape_product, save_root_folder=save_root_folder), get_driver,
+                     fast_path=partial(scrape_product_from_api, save_root_folder=save_root_folder),
+                     journal=job_journal)
+
+def ask_job():
     product_urls = []
     while True:
         url = input("Enter product URL (or type 'no' to finish): ").strip()
@@ -149,15 +114,38 @@ def main():
 
     if not product_urls:
         print("No product URLs entered, exiting.")
-        return
+        return None, []
 
     save_folder = input("Enter folder to save images (default: 'downloaded_products'): ").strip()
     if not save_folder:
         save_folder = "downloaded_products"
     os.makedirs(save_folder, exist_ok=True)
+    return save_folder, product_urls
+
+def main():
+    print("=== Product Images Batch Scraper ===")
+    incremental = sitemap.command_line()
+    if incremental:
+        # Daily runs: only products whose sitemap <lastmod> changed since the last one
+        site_url, root_folder = incremental[0], incremental[1] or "downloaded_products"
+        sitemap.run_changed(journal.Journal("melaniecasey_sitemap"), site_url, root_folder,
+                            partial(scrape_product, save_root_folder=root_folder), get_driver,
+                            fast_path=partial(scrape_product_from_api, save_root_folder=root_folder),
+                            product_filter=lambda url: "/products/" in url)
+        return
+    job_journal = journal.Journal("melaniecasey")
+    resumed = job_journal.offer_resume()
+    if resumed:
+        save_folder, product_urls = resumed
+        os.makedirs(save_folder, exist_ok=True)
+    else:
+        save_folder, product_urls = ask_job()
+        if not product_urls:
+            return
+        job_journal.start(product_urls, save_folder)
 
     print(f"\nStarting to scrape {len(product_urls)} products...")
-    scrape_products(product_urls, save_folder)
+    scrape_products(product_urls, save_folder, job_journal)
     print("\nAll done!")
 
 if __name__ == "__main__":
@@ -0,0 +1,59 @@
+import argparse
+import itertools
+import os
+import sys
+from functools import partial
+
+# Shared helpers live in scrap_common/ at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scrap_common import journal, url_source, workers
+
+import Malaniecasey_get_link as get_link
+import Malaniecasey_image_scrap as image_scrap
+
+# Three overlapping stages: links stream in from the listing (or a URL file/stdin)
+# through a bounded queue, browsers render product pages as links arrive, and
+# each finished product downloads in the background (see scrap_common/workers.py).
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Scrape a listing's products while its links are still being collected.")
+    parser.add_argument("listing_url", nargs="?", help="product listing page to collect links from")
+    parser.add_argument("--urls", help="read product URLs from this file instead, '-' for stdin "
+                                       "(one per line, comma-joined links.txt or JSONL)")
+    parser.add_argument("--folder", help="folder to save images (default: 'downloaded_products')")
+    return parser.parse_args()
+
+def discover(source):
+    # A listing page to scroll, or a URL file / stdin
+    if source.lower().startswith("http"):
+        return get_link.iter_product_links(source)
+    return url_source.iter_urls(source)
+
+def main():
+    print("=== Product Links + Images Pipeline ===")
+    args = parse_args()
+    job_journal = journal.Journal("melaniecasey_pipeline")
+    # stdin carries the URLs when streaming, so only offer to resume interactive runs
+    resumed = job_journal.offer_resume() if args.urls != "-" else None
+    if resumed:
+        save_folder, product_urls = resumed
+        # Discovery cut short by the interruption is run again; products already downloaded are skipped
+        source = job_journal.unfinished_source()
+        if source:
+            product_urls = itertools.chain(product_urls, discover(source))
+    else:
+        source = args.urls or args.listing_url or input("Enter the product listing URL: ").strip()
+        product_urls = discover(source)
+        save_folder = args.folder or (input("Enter folder to save images (default: 'downloaded_products'): ").strip()
+                                      if args.urls != "-" else "") or "downloaded_products"
+        # stdin cannot be read twice, so a resume cannot finish its discovery
+        job_journal.start([], save_folder, source=source if source != "-" else None)
+    os.makedirs(save_folder, exist_ok=True)
+
+    workers.run_pool(product_urls, partial(image_scrap.scrape_product, save_root_folder=save_folder), image_scrap.get_driver,
+                     fast_path=partial(image_scrap.scrape_product_from_api, save_root_folder=save_folder),
+                     journal=job_journal)
+    print("\nAll done!")
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,16 @@
+import itertools
 import os
 import re
-import time
+import sys
 import traceback
-from io import BytesIO
-from PIL import Image
-import requests
+from functools import partial
 
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
-from selenium.common.exceptions import TimeoutException, WebDriverException
-from webdriver_manager.chrome import ChromeDriverManager
-from urllib.parse import urlparse, urljoin
+from selenium.common.exceptions import WebDriverException
+
+# Shared helpers live in scrap_common/ at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scrap_common import browser, capture, dom_snapshot, downloader, journal, listing, readiness, resolver, selector_cache, shopify, sitemap, workers
 
 def safe_filename(s):
     return re.sub(r'[^\w\-_\. ]', '_', s.strip())
@@ -24,109 +22,85 @@ def robust_input(prompt, default=None):
     except Exception:
         return default if default is not None else ""
 
+# Containers that hold the main product gallery on the Shopify themes we scrape
+MAIN_GALLERY_SELECTOR = ".product-gallery, .Product__Slideshow, .product-media--container, .main-image, .carousel, .product__media-list, div[data-image-id]"
+MAIN_GALLERY_IMAGES = ", ".join(f"{sel.strip()} img" for sel in MAIN_GALLERY_SELECTOR.split(","))
+
 def get_driver():
-    chrome_options = Options()
-    chrome_options.add_argument('--disable-blink-features=AutomationControlled')
-    chrome_options.add_argument("--disable-gpu")
-    chrome_options.add_argument("--no-sandbox")
-    chrome_options.add_argument("--disable-dev-shm-usage")
-    chrome_options.add_argument('--window-size=1400,1000')
-    # Uncomment for headless mode
-    # chrome_options.add_argument('--headless')
     try:
-        driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=chrome_options)
-        driver.set_page_load_timeout(90)
-        return driver
+        return browser.get_driver(page_load_timeout=90)
     except Exception as e:
         print("Could not initiate browser: ", e)
         exit(1)
 
 def get_product_links_from_collection(driver, collection_url):
+    """Product links of a collection whose grid only appears in the browser (infinite scroll included)."""
     print(f"Loading collection page: {collection_url}")
     try:
-        driver.get(collection_url)
+        browser.load(driver, collection_url)
     except Exception as e:
         print(f"  ⚠️ Error: could not load collection page, skipping. [{e}]")
-        return []
-    time.sleep(3)
-    links = set()
-    selectors = [
-        "a.full-unstyled-link",
-        "a.product-title",
-        "a.grid-view-item__link",
-        "a.productitem--image-link",
-        "a[href*='/products/']"
-    ]
-    for selector in selectors:
+        return
+    for href in listing.harvest_links(driver, listing.PRODUCT_LINK_CSS):
+        yield listing.product_url(href, collection_url)
+
+def browse_collection(collection_url):
+    driver = get_driver()
+    try:
+        yield from dict.fromkeys(get_product_links_from_collection(driver, collection_url))
+    finally:
         try:
-            elements = driver.find_elements(By.CSS_SELECTOR, selector)
-            for el in elements:
-                href = el.get_attribute('href')
-                if href and '/products/' in href:
-                    links.add(href.split('?')[0])
-        except Exception:
-            continue
-    print(f"Found {len(links)} product links.")
-    return sorted(list(links))
+            driver.quit()
+        except: pass
+
+GALLERY_SELECTORS = [
+    ".product-gallery, .Product__Slideshow, .product-media--container, .main-image, .carousel, .product__media-list",
+    ".image-slide.carousel-cell",
+    "div[data-image-id]",
+    ".product-images__thumbnails",
+    "div[class*='gallery']",
+    "ul[role='list']",
+]
+IMAGE_ATTRS = list(resolver.SRCSET_ATTRS + resolver.SRC_ATTRS)
+# Images of every candidate gallery plus the thumbnail fallback, read in one round trip
+GALLERY_QUERIES = {f"gallery{i}": {"scope": sel, "css": "img", "attrs": IMAGE_ATTRS} for i, sel in enumerate(GALLERY_SELECTORS)}
+THUMBS_CSS = "ul[class*='thumbnails'] img, .thumbnails img"
+GALLERY_QUERIES["thumbs"] = {"css": THUMBS_CSS, "attrs": IMAGE_ATTRS}
+# Cascade order, as (selector remembered per host by scrap_common/selector_cache.py, query key)
+GALLERY_CASCADE = [(sel, f"gallery{i}") for i, sel in enumerate(GALLERY_SELECTORS)] + [(THUMBS_CSS, "thumbs")]
+
+def image_candidates(img_attrs, product_url):
+    # One URL per <img>: the srcset candidate or CDN size we want (see scrap_common/resolver.py)
+    url = resolver.image_url(img_attrs, product_url)
+    if not url or any(x in url.lower() for x in ['icon', 'placeholder', 'logo', '.svg', '.ico', 'avatar']):
+        return []
+    return [url]
+
+def gallery_images(records, product_url):
+    # The first container that yields usable images (all of them for the unscoped thumbnails)
+    containers = {}
+    for record in records:
+        containers.setdefault(record.get("scope"), []).extend(image_candidates(record["attrs"], product_url))
+    return next((urls for urls in containers.values() if urls), [])
 
 def get_gallery_images(driver, product_url):
-    # List of gallery containers for Shopify and similar
-    gallery_selectors = [
-        ".product-gallery, .Product__Slideshow, .product-media--container, .main-image, .carousel, .product__media-list",
-        ".image-slide.carousel-cell",
-        "div[data-image-id]",
-        ".product-images__thumbnails",
-        "div[class*='gallery']",
-        "ul[role='list']",
-    ]
-    images = set()
-    found = False
-    for gallery_sel in gallery_selectors:
-        try:
-            containers = driver.find_elements(By.CSS_SELECTOR, gallery_sel)
-            for container in containers:
-                imgs = container.find_elements(By.TAG_NAME, "img")
-                for el in imgs:
-                    for attr in ["srcset", "data-srcset", "data-src", "src"]:
-                        url = el.get_attribute(attr)
-                        if url:
-                            if ',' in url:
-                                url = url.split(',')[-1].split()[0]
-                            url = url.strip()
-                            if url.startswith("//"):
-                                url = "https:" + url
-                            elif url.startswith("/"):
-                                parsed = urlparse(product_url)
-                                url = urljoin(f"{parsed.scheme}://{parsed.netloc}", url)
-                            if not any(x in url.lower() for x in ['icon', 'placeholder', 'logo', '.svg', '.ico', 'avatar']):
-                                images.add(url)
-                                found = True
-                if found and images:
-                    break
-            if found:
-                break
-        except Exception:
-            continue
-    if not images:
-        try:
-            thumbs = driver.find_elements(By.CSS_SELECTOR, "ul[class*='thumbnails'] img, .thumbnails img")
-            for el in thumbs:
-                for attr in ["srcset", "data-srcset", "data-src", "src"]:
-                    url = el.get_attribute(attr)
-                    if url:
-                        if ',' in url:
-                            url = url.split(',')[-1].split()[0]
-                        url = url.strip()
-                        if url.startswith("//"):
-                            url = "https:" + url
-                        elif url.startswith("/"):
-                            parsed = urlparse(product_url)
-                            url = urljoin(f"{parsed.scheme}://{parsed.netloc}", url)
-                        if not any(x in url.lower() for x in ['icon', 'placeholder', 'logo', '.svg', '.ico', 'avatar']):
-                            images.add(url)
-        except Exception:
-            pass
-    return sorted(list(images))
+    # The selector that won on this store before is read alone, the whole cascade only if it misses
+    selector = selector_cache.preferred(product_url, "gallery")
+    learned = dict(GALLERY_CASCADE).get(selector)
+    if learned:
+        images = gallery_images(dom_snapshot.snapshot(driver, {learned: GALLERY_QUERIES[learned]})[learned], product_url)
+        if images:
+            selector_cache.hit(product_url, "gallery", selector)
+            return sorted(set(images))
+        selector_cache.miss(product_url, "gallery")
+    page = dom_snapshot.snapshot(driver, GALLERY_QUERIES)
+    # The first selector that yields usable images wins
+    for selector, key in GALLERY_CASCADE:
+        images = gallery_images(page[key], product_url)
+        if images:
+            selector_cache.hit(product_url, "gallery", selector)
+            return sorted(set(images))
+    return []
 
 def get_product_name(driver, product_url):
     try:
@@ -137,46 +111,39 @@ def get_product_name(driver, product_url):
     return product_url.rstrip('/').rsplit('/',1)[-1].replace('-', ' ').title()
 
 def download_and_number_images(img_urls, save_folder):
-    count = 1
-    headers = {'User-Agent': "Mozilla/5.0"}
-    used_names = set()
-    for img_url in img_urls:
-        try:
-            resp = requests.get(img_url, headers=headers, timeout=45)
-            resp.raise_for_status()
-            img = Image.open(BytesIO(resp.content))
-            if img.width < 100 or img.height < 100:
-                continue
-            new_path = os.path.join(save_folder, f"{count}.jpg")
-            img = img.convert("RGB")
-            img.save(new_path, "JPEG")
-            used_names.add(os.path.basename(new_path).lower())
-            print(f"    ✔ {os.path.abspath(new_path)} [{img.size}]")
-            count += 1
-        except Exception as e:
-            print(f"    ✘ Failed: {img_url} [{repr(e)}]")
-            continue
-    # Remove other files that do not match the pattern <number>.jpg
-    for file in os.listdir(save_folder):
-        if not re.match(r'^\d+\.jpg$', file.lower()):
-            try:
-                os.remove(os.path.join(save_folder, file))
-            except Exception as e:
-                print(f"    ⚠️ Couldn't delete: {file} [{repr(e)}]")
+    # Held across the cleanup too, which would delete the temp files of another job in this folder
+    with downloader.folder_lock(save_folder):
+        downloader.download_numbered(img_urls, save_folder, min_size=100, compact=True, timeout=45)
+        # Remove other files that do not match the pattern <number>.jpg
+        for file in os.listdir(save_folder):
+            if not re.match(r'^\d+\.jpg$', file.lower()):
+                try:
+                    os.remove(os.path.join(save_folder, file))
+                except Exception as e:
+                    print(f"    ⚠️ Couldn't delete: {file} [{repr(e)}]")
+
+def save_product_images(img_urls, product_folder):
+    download_and_number_images(img_urls, product_folder)
+    print(f"    >> Saved in folder: {os.path.abspath(product_folder)}\n")
+
+def get_product_images_from_api(product_url, base_save_dir):
+    """Shopify /products/<handle>.js fast path; same job as get_product_images, or None."""
+    product = shopify.get_product(product_url)
+    if product is None:
+        return None
+    product_name, img_urls = product
+    product_folder = os.path.join(base_save_dir, safe_filename(product_name)[:60])
+    os.makedirs(product_folder, exist_ok=True)
+    print(f"    {len(img_urls)} gallery images found for '{product_name}' (Shopify API)")
+    return partial(save_product_images, img_urls, product_folder)
 
 def get_product_images(product_url, driver, base_save_dir):
+    """Load a product page and return the job that downloads its gallery (or None)."""
     print(f"  Visiting product: {product_url}")
     try:
-        try:
-            driver.set_page_load_timeout(70)
-            driver.get(product_url)
-        except TimeoutException:
-            print(f"    ⚠️ Timeout while loading {product_url}. Skipping.")
-            return
-        except Exception as e:
-            print(f"    ⚠️ Error loading {product_url}: {repr(e)}")
-            return
-        time.sleep(2)
+        driver.set_page_load_timeout(70)
+        browser.load(driver, product_url)  # timeouts are WebDriverExceptions, retried by the worker pool
+        readiness.wait_for_gallery(driver, MAIN_GALLERY_SELECTOR, MAIN_GALLERY_IMAGES)
         product_name = get_product_name(driver, product_url)
         folder_name = safe_filename(product_name)[:60]
         product_folder = os.path.join(base_save_dir, folder_name)
@@ -184,49 +151,68 @@ def get_product_images(product_url, driver, base_save_dir):
         img_urls = get_gallery_images(driver, product_url)
         print(f"    {len(img_urls)} gallery images found for '{product_name}'")
         if img_urls:
-            download_and_number_images(img_urls, product_folder)
-            print(f"    >> Saved in folder: {os.path.abspath(product_folder)}\n")
-        else:
-            print(f"    !! No images found for {product_name}\n")
+            capture.harvest(driver, img_urls)
+            return partial(save_product_images, img_urls, product_folder)
+        print(f"    !! No images found for {product_name}\n")
+    except WebDriverException:
+        raise  # the worker pool checks the browser and restarts it if needed
     except Exception as e:
         print(f"    ⚠️ Unhandled error: {e}")
         traceback.print_exc()
 
-def main():
-    print("=== Shopify/Porter Lyons Collection Product Image & Renamer Scraper ===")
+def ask_job():
     collection_url = robust_input("Enter FULL collection page URL: ")
     if not collection_url.lower().startswith("http"):
         print("Please enter a valid collection page URL (starting with http...)")
-        return
+        return None, None
     folder_path = robust_input("Enter base folder to save images (default: 'downloaded_collection'): ", default='downloaded_collection')
     os.makedirs(folder_path, exist_ok=True)
+    return folder_path, collection_url
 
-    driver = get_driver()
-    try:
-        links = get_product_links_from_collection(driver, collection_url)
-        if not links:
-            print("No products found on collection page.")
+def find_products(collection_url):
+    links = shopify.get_collection_links(collection_url)
+    if links is None:
+        # Every page of the collection, streamed to the workers as each page arrives
+        print("Crawling the collection pages, products start downloading as they are found...\n")
+        return listing.crawl_collection(collection_url, fallback=browse_collection)
+    print(f"Found {len(links)} products. Starting download...\n")
+    return links
+
+def main():
+    print("=== Shopify/Porter Lyons Collection Product Image & Renamer Scraper ===")
+    incremental = sitemap.command_line()
+    if incremental:
+        # Daily runs: only products whose sitemap <lastmod> changed since the last one
+        site_url, root_folder = incremental[0], incremental[1] or "downloaded_collection"
+        sitemap.run_changed(journal.Journal("porterlyons_collection_sitemap"), site_url, root_folder,
+                            lambda driver, url: get_product_images(url, driver, root_folder), get_driver,
+                            fast_path=partial(get_product_images_from_api, base_save_dir=root_folder),
+                            product_filter=lambda url: "/products/" in url)
+        return
+    job_journal = journal.Journal("porterlyons_collection")
+    # Resuming picks up the unfinished products, and crawls the collection again if its crawl was cut short
+    resumed = job_journal.offer_resume()
+    if resumed:
+        folder_path, links = resumed
+        os.makedirs(folder_path, exist_ok=True)
+        collection_url = job_journal.unfinished_source()
+        if collection_url:
+            links = itertools.chain(links, find_products(collection_url))
+    else:
+        folder_path, collection_url = ask_job()
+        if not collection_url:
             return
-        print(f"Found {len(links)} products. Starting download...\n")
-        for idx, product_link in enumerate(links, 1):
-            print(f"[{idx}/{len(links)}] {product_link}")
-            try:
-                get_product_images(product_link, driver, folder_path)
-            except Exception as e:
-                print(f"  ⚠️ Fatal error with {product_link}: {e}")
-                continue
-            # Restart driver every 10 products to avoid resource leaks
-            if idx % 10 == 0:
-                try:
-                    driver.quit()
-                except: pass
-                driver = get_driver()
-            time.sleep(2)  # Be nice to the shop and avoid rate-limits
-        print("=== ALL DONE! ===")
-    finally:
-        try:
-            driver.quit()
-        except: pass
+        links = find_products(collection_url)
+        if isinstance(links, list):
+            job_journal.start(links, folder_path)
+        else:
+            # Streamed links are added to the journal as they are found
+            job_journal.start([], folder_path, source=collection_url)
+    # Requests to the shop adapt their pace to its responses to stay polite and avoid rate-limits
+    workers.run_pool(links, lambda driver, url: get_product_images(url, driver, folder_path), get_driver,
+                     fast_path=partial(get_product_images_from_api, base_save_dir=folder_path),
+                     journal=job_journal)
+    print("=== ALL DONE! ===")
 
 if __name__ == "__main__":
     main()
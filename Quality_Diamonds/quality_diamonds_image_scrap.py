@@ -1,125 +1,117 @@
+import hashlib
 import os
 import re
-import time
-from io import BytesIO
+import sys
+from functools import partial
 from urllib.parse import urlparse, urljoin
 
-import requests
-from PIL import Image
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
 from selenium.common.exceptions import NoSuchElementException, TimeoutException
-from webdriver_manager.chrome import ChromeDriverManager
+
+# Shared helpers live in scrap_common/ at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scrap_common import browser, capture, dom_snapshot, downloader, journal, readiness, resolver, sitemap, workers
 
 def safe_filename(name: str) -> str:
     """Clean string to safe folder/file name."""
     return re.sub(r'[^\w\-_. ]', '_', name).strip()[:60]
 
 def get_driver():
-    options = Options()
-    # Uncomment to run headless
-    # options.add_argument("--headless")
-    options.add_argument("--disable-blink-features=AutomationControlled")
-    options.add_argument("--disable-gpu")
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-    options.add_argument("--window-size=1400,1000")
-    driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
-    driver.set_page_load_timeout(90)
-    return driver
+    return browser.get_driver(page_load_timeout=90)
+
+# All media sources of a product page, read in one round trip
+MEDIA_QUERIES = {
+    "thumbs": {"css": "div.zoom-gallery a.mz-thumb img", "attrs": list(resolver.SRCSET_ATTRS + resolver.SRC_ATTRS)},
+    "gallery": {"css": "div.zoom-gallery-slide figure img", "attrs": list(resolver.SRCSET_ATTRS + resolver.SRC_ATTRS)},
+    "magic360": {"css": "a.Magic360", "attrs": ["data-magic360-options"]},
+    "videos": {"css": "div.zoom-gallery-slide.video-slide iframe", "attrs": ["src"]},
+}
 
 def extract_product_media(driver, product_url):
     print(f"Visiting: {product_url}")
-    driver.get(product_url)
-    time.sleep(2)  # wait page load, adjust if needed
+    browser.load(driver, product_url)
+    readiness.wait_for_gallery(driver, "div.zoom-gallery", "div.zoom-gallery img")
 
     images = set()
     spins = set()
     videos = set()
+    page = dom_snapshot.snapshot(driver, MEDIA_QUERIES)
 
     # 1. Extract thumbnails (images inside zoom-gallery a.mz-thumb img)
-    try:
-        thumbs = driver.find_elements(By.CSS_SELECTOR, "div.zoom-gallery a.mz-thumb img")
-        for img in thumbs:
-            src = img.get_attribute("src")
-            if src and ("icon" not in src and "sprite" not in src):
-                full_url = src if src.startswith("http") else urljoin(product_url, src)
-                images.add(full_url)
-    except Exception:
-        pass
+    for record in page["thumbs"]:
+        full_url = resolver.image_url(record["attrs"], product_url)
+        if full_url and "icon" not in full_url and "sprite" not in full_url:
+            images.add(full_url)
 
     # 2. Extract gallery/main images (div.zoom-gallery-slide figure img)
-    try:
-        gallery_imgs = driver.find_elements(By.CSS_SELECTOR, "div.zoom-gallery-slide figure img")
-        for img in gallery_imgs:
-            src = img.get_attribute("src")
-            if src and ("icon" not in src):
-                full_url = src if src.startswith("http") else urljoin(product_url, src)
-                images.add(full_url)
-    except Exception:
-        pass
+    for record in page["gallery"]:
+        full_url = resolver.image_url(record["attrs"], product_url)
+        if full_url and "icon" not in full_url:
+            images.add(full_url)
 
     # 3. Extract 360 spin images (from data-magic360-options attribute)
-    try:
-        magic360_els = driver.find_elements(By.CSS_SELECTOR, "a.Magic360")
-        for el in magic360_els:
-            data = el.get_attribute("data-magic360-options")
-            if data and "images:" in data:
-                imgs_raw = data.split("images:", 1)[1].split(";")[0]
-                spin_urls = [i.strip() for i in imgs_raw.split(" ") if i.strip()]
-                for s in spin_urls:
-                    full_url = urljoin(product_url, s)
-                    spins.add(full_url)
-    except Exception:
-        pass
+    for data in dom_snapshot.attr_values(page["magic360"], "data-magic360-options"):
+        if "images:" in data:
+            imgs_raw = data.split("images:", 1)[1].split(";")[0]
+            spin_urls = [i.strip() for i in imgs_raw.split(" ") if i.strip()]
+            for s in spin_urls:
+                full_url = urljoin(product_url, s)
+                spins.add(full_url)
 
     # 4. Extract embedded videos (iframe inside div.zoom-gallery-slide.video-slide)
-    try:
-        iframes = driver.find_elements(By.CSS_SELECTOR, "div.zoom-gallery-slide.video-slide iframe")
-        for iframe in iframes:
-            src = iframe.get_attribute("src")
-            if src:
-                full_url = src if src.startswith("http") else urljoin(product_url, src)
-                videos.add(full_url)
-    except Exception:
-        pass
+    for src in dom_snapshot.attr_values(page["videos"], "src"):
+        full_url = src if src.startswith("http") else urljoin(product_url, src)
+        videos.add(full_url)
 
     return list(images), list(spins), list(videos)
 
-def download_images(image_urls, folder_path):
-    os.makedirs(folder_path, exist_ok=True)
-    headers = {"User-Agent": "Mozilla/5.0"}
-    for idx, url in enumerate(image_urls, 1):
-        try:
-            r = requests.get(url, headers=headers, timeout=60)
-            r.raise_for_status()
-            img = Image.open(BytesIO(r.content))
-            save_path = os.path.join(folder_path, f"{idx}.jpg")
-            img.convert("RGB").save(save_path, "JPEG")
-            print(f"  ✔ Saved image {idx} at {save_path}")
-        except Exception as e:
-            print(f"  ✘ Failed to download {url} - {e}")
-
-def download_spin_images(spin_urls, folder_path):
-    if not spin_urls:
-        return
-    spin_folder = os.path.join(folder_path, "360-spin")
-    os.makedirs(spin_folder, exist_ok=True)
-    download_images(spin_urls, spin_folder)
+def download_product_media(image_urls, spin_urls, folder_path):
+    # One batch so gallery and 360-spin frames share the same CDN connections
+    groups = [(image_urls, folder_path)] if image_urls else []
+    if spin_urls:
+        groups.append((spin_urls, os.path.join(folder_path, "360-spin")))
+    if groups:
+        downloader.download_groups(groups)
 
 def save_video_links(video_urls, folder_path):
     if not video_urls:
         return
+    os.makedirs(folder_path, exist_ok=True)  # a video-only product has no images to create it
     file_path = os.path.join(folder_path, "video_links.txt")
     with open(file_path, "w", encoding="utf-8") as f:
         for url in video_urls:
             f.write(url + "\n")
     print(f"  ✔ Saved video links in {file_path}")
 
-def main():
-    print("=== Product Media Downloader ===")
+# Sitemap pages that are not products: the home page, top-level category
+# pages and the store's editorial and account sections
+NON_PRODUCT_SECTIONS = re.compile(
+    r"(?:blog|news|education|guides?|pages|about-us|about|contact(?:-us)?|faq|"
+    r"reviews|showroom|customer|account|checkout|cart|catalogsearch|search|policies)$",
+    re.IGNORECASE,
+)
+
+def is_product_page(url):
+    parts = [part for part in urlparse(url).path.split("/") if part]
+    return len(parts) >= 2 and not NON_PRODUCT_SECTIONS.match(parts[0])
+
+def process_product(driver, link, root_folder):
+    # Generate a safe folder name from the last URL segment (a hash of the URL, unique per product, if it has none)
+    product_name = safe_filename(link.rstrip('/').split('/')[-1] or "product_" + hashlib.sha1(link.encode()).hexdigest()[:10])
+    product_folder = os.path.join(root_folder, product_name)
+
+    imgs, spins, videos = extract_product_media(driver, link)
+    print(f"  Found {len(imgs)} images, {len(spins)} 360-spin images, {len(videos)} videos")
+    if not imgs and not spins and not videos:
+        print("  ✘ No images or videos found!")
+        return None
+    capture.harvest(driver, list(imgs) + list(spins))
+
+    def save_media():
+        download_product_media(imgs, spins, product_folder)
+        save_video_links(videos, product_folder)
+    return save_media
+
+def ask_job():
     product_urls = []
     while True:
         url = input("Enter product URL (or 'no' to finish): ").strip()
@@ -132,39 +124,39 @@ def main():
 
     if not product_urls:
         print("No product URLs entered. Exiting.")
-        return
+        return None, []
 
     root_folder = input("Enter folder to save products (default: 'products_media'): ").strip()
     if not root_folder:
         root_folder = "products_media"
     os.makedirs(root_folder, exist_ok=True)
+    return root_folder, product_urls
 
-    driver = get_driver()
-
-    try:
-        for i, link in enumerate(product_urls, 1):
-            print(f"\n[{i}/{len(product_urls)}] Processing product: {link}")
-
-            # Generate a safe folder name from the last URL segment
-            product_name = safe_filename(link.rstrip('/').split('/')[-1] or f"product_{i}")
-            product_folder = os.path.join(root_folder, product_name)
-
-            try:
-                imgs, spins, videos = extract_product_media(driver, link)
-                print(f"  Found {len(imgs)} images, {len(spins)} 360-spin images, {len(videos)} videos")
-
-                download_images(imgs, product_folder)
-                download_spin_images(spins, product_folder)
-                save_video_links(videos, product_folder)
-
-                time.sleep(1)  # polite delay between products
-
-            except Exception as e:
-                print(f"  ✘ Error processing {link}: {e}")
-
-    finally:
-        driver.quit()
-        print("\nAll done!")
+def main():
+    print("=== Product Media Downloader ===")
+    incremental = sitemap.command_line()
+    if incremental:
+        # Daily runs: only products whose sitemap <lastmod> changed since the last one
+        site_url, root_folder = incremental[0], incremental[1] or "products_media"
+        sitemap.run_changed(journal.Journal("quality_diamonds_sitemap"), site_url, root_folder,
+                            partial(process_product, root_folder=root_folder), get_driver,
+                            product_filter=is_product_page)
+        return
+    job_journal = journal.Journal("quality_diamonds")
+    resumed = job_journal.offer_resume()
+    if resumed:
+        root_folder, product_urls = resumed
+        os.makedirs(root_folder, exist_ok=True)
+    else:
+        root_folder, product_urls = ask_job()
+        if not product_urls:
+            return
+        job_journal.start(product_urls, root_folder)
+
+    # Page loads are paced per host by scrap_common/ratelimit.py
+    workers.run_pool(product_urls, partial(process_product, root_folder=root_folder), get_driver,
+                     journal=job_journal)
+    print("\nAll done!")
 
 if __name__ == "__main__":
     main()
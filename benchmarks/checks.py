@@ -0,0 +1,253 @@
+"""Offline checks of behaviour the benchmarks cannot see in throughput numbers.
+
+Each check sets up its own state in a temporary directory and fails with an
+``AssertionError`` naming what went wrong::
+
+    python benchmarks/checks.py                 # every check
+    python benchmarks/checks.py http2           # only these
+"""
+import asyncio
+import hashlib
+import importlib.util
+import itertools
+import json
+import os
+import sys
+import tempfile
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from scrap_common import config, selector_cache
+
+
+def _load_script(path):
+    spec = importlib.util.spec_from_file_location(os.path.splitext(os.path.basename(path))[0], os.path.join(REPO, path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class _GalleryPage:
+    """Stands in for a browser showing a product whose gallery only the ``present`` query keys match."""
+
+    def __init__(self, present):
+        self.present = present
+
+    def execute_script(self, script, queries):
+        return {key: [{"scope": 0, "attrs": {"src": f"https://cdn.example/{key}.jpg"}}] if key in self.present else []
+                for key in queries}
+
+
+def check_selector_cache(tmp):
+    """The PortLyons gallery keeps its learned selector until SELECTOR_MISSES misses in a row."""
+    config.SELECTOR_CACHE = os.path.join(tmp, "selectors.json")
+    porter = _load_script("PortLyons/PorterLyons_image_scrap.py")
+    url = "http://store.example/products/ring"
+    first, second = porter.GALLERY_SELECTORS[:2]
+
+    def scrape(present):
+        return porter.get_gallery_images(_GalleryPage(present), url)
+
+    scrape({"gallery0"})
+    assert selector_cache.preferred(url, "gallery") == first
+    # A product now and then without the usual gallery: miss, ok, ok, miss, ok, ok...
+    for _ in range(config.SELECTOR_MISSES + 1):
+        assert scrape({"gallery1"}) == ["https://cdn.example/gallery1.jpg"]
+        scrape({"gallery0", "gallery1"})
+        scrape({"gallery0", "gallery1"})
+    assert selector_cache.preferred(url, "gallery") == first, "scattered misses demoted the learned selector"
+    for _ in range(config.SELECTOR_MISSES - 1):
+        scrape({"gallery1"})
+    assert selector_cache.preferred(url, "gallery") == first, "demoted before SELECTOR_MISSES misses in a row"
+    scrape({"gallery1"})
+    assert selector_cache.preferred(url, "gallery") == second, "not demoted after SELECTOR_MISSES misses in a row"
+    selector_cache.save()
+    selector_cache._learned.clear()
+    selector_cache._loaded = False
+    assert selector_cache.preferred(url, "gallery") == second, "learned selector not reloaded from disk"
+
+
+def _files(folder):
+    return {name: hashlib.sha1(open(os.path.join(folder, name), "rb").read()).hexdigest()
+            for name in sorted(os.listdir(folder))}
+
+
+def check_http2(tmp):
+    """The async engine negotiates HTTP/2 with an h2c server and saves what the threads engine saves over HTTP/1.1."""
+    import fixture_server
+    from scrap_common import async_downloader, downloader
+    config.STORE_DIR = os.path.join(tmp, "store")
+    config.RATE_STATE = os.path.join(tmp, "rates.json")
+    config.HTTP2_PRIOR_KNOWLEDGE = True
+    config.RETRY_ATTEMPTS = 1
+    settings = fixture_server.Settings(products=2, images=3)
+    h1 = fixture_server.serve(0, settings)
+    h2 = fixture_server.serve(0, settings, http2=True)
+
+    async def version(url):
+        async with async_downloader.make_client() as client:
+            return (await client.get(url)).http_version
+    assert asyncio.run(version(f"http://127.0.0.1:{h2.server_port}/products/porter-1.js")) == "HTTP/2", \
+        "the async engine did not speak HTTP/2 to the h2c fixture"
+
+    # A 404 in the middle of the gallery leaves its number out, as over HTTP/1.1
+    paths = ["/cdn/shop/files/porter-1-1.jpg?width=800", "/cdn/shop/files/porter-1-2.jpg?width=1600",
+             "/missing.jpg", "/cdn/shop/files/porter-1-3.jpg?width=800"]
+    threads_folder, async_folder = os.path.join(tmp, "threads"), os.path.join(tmp, "async")
+    downloader.download_groups([([f"http://127.0.0.1:{h1.server_port}{p}" for p in paths], threads_folder)])
+    async_downloader.download_groups([([f"http://127.0.0.1:{h2.server_port}{p}" for p in paths], async_folder)])
+    assert list(_files(async_folder)) == ["1.jpg", "2.jpg", "4.jpg"], f"unexpected files {list(_files(async_folder))}"
+    assert _files(async_folder) == _files(threads_folder), "HTTP/2 and HTTP/1.1 downloads differ"
+
+    # A CDN slower than the timeout fails the image instead of hanging the product
+    slow = fixture_server.serve(0, fixture_server.Settings(products=1, images=1, latency=3), http2=True)
+    started = time.monotonic()
+    saved = async_downloader.download_groups([([f"http://127.0.0.1:{slow.server_port}{paths[0]}"],
+                                               os.path.join(tmp, "slow"))], timeout=0.5)
+    assert saved == [[]] and time.monotonic() - started < 2.5, "timeout not honoured over HTTP/2"
+    for server in (h1, h2, slow):
+        server.shutdown()
+
+
+def check_same_folder(tmp):
+    """Products downloading into the same folder at once neither share temp files nor delete each other's."""
+    import fixture_server
+    from concurrent.futures import ThreadPoolExecutor
+    from scrap_common import downloader
+    config.STORE_DIR = os.path.join(tmp, "store")
+    config.RATE_STATE = os.path.join(tmp, "rates.json")
+    porter = _load_script("PortLyons/PorterLyons_image_scrap.py")
+    server = fixture_server.serve(0, fixture_server.Settings(products=2, images=3, bandwidth=500))
+    base = f"http://127.0.0.1:{server.server_port}/cdn/shop/files"
+    folder = os.path.join(tmp, "Same Title")
+    first = [f"{base}/porter-1-{i}.jpg?width=800" for i in (1, 2, 3)]
+    second = [f"{base}/porter-2-{i}.jpg?width=1600" for i in (1, 2, 3)]
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        # PorterLyons deletes everything but N.jpg once its images are in
+        cleanup = pool.submit(porter.download_and_number_images, first, folder)
+        other = pool.submit(downloader.download_numbered, second, folder)
+        cleanup.result()
+        assert len(other.result()) == 3, "a concurrent job in the same folder lost images"
+    assert sorted(os.listdir(folder)) == ["1.jpg", "2.jpg", "3.jpg"], f"left behind {sorted(os.listdir(folder))}"
+    server.shutdown()
+
+
+def check_rerun(tmp):
+    """Running a product again (store hits and same-bytes downloads) leaves only its numbered files."""
+    import fixture_server
+    from scrap_common import downloader
+    config.STORE_DIR = os.path.join(tmp, "store")
+    config.RATE_STATE = os.path.join(tmp, "rates.json")
+    server = fixture_server.serve(0, fixture_server.Settings(products=1, images=2))
+    urls = [f"http://127.0.0.1:{server.server_port}/cdn/shop/files/cullen-1-{i}.jpg?width=800" for i in (1, 2)]
+    folder = os.path.join(tmp, "product")
+    for run in range(3):
+        assert len(downloader.download_numbered(urls, folder)) == 2
+        assert sorted(os.listdir(folder)) == ["1.jpg", "2.jpg"], f"run {run + 1} left {sorted(os.listdir(folder))}"
+    server.shutdown()
+
+
+class _FakeBrowser:
+    def quit(self):
+        pass
+
+
+def check_resume_discovery(tmp):
+    """Resuming a job whose listing stream was cut short discovers the rest of the listing, once each."""
+    from scrap_common import journal, workers
+    config.RECYCLE_PAGES = 0
+    config.RETRY_ROUNDS = 0
+    listing = [f"https://store.example/products/p{n}" for n in range(6)]
+    processed = []
+
+    def discover(stop=None):
+        for n, url in enumerate(listing):
+            if n == stop:
+                raise ConnectionError("listing page failed")  # the run dies while still paging
+            yield url
+
+    def process_product(driver, url):
+        processed.append(url)
+        return lambda: None
+
+    path = os.path.join(tmp, "journal.db")
+    first = journal.Journal("job", path)
+    first.start([], tmp, source="https://store.example/collections/all")
+    workers.run_pool(discover(stop=3), process_product, _FakeBrowser, workers=1, journal=first)
+    second = journal.Journal("job", path)
+    assert second.unfinished() == (tmp, []), "a job with discovery left over was not offered for resume"
+    source = second.unfinished_source()
+    assert source == "https://store.example/collections/all", f"source {source!r} not kept"
+    leftover = second.unfinished()[1]
+    workers.run_pool(itertools.chain(leftover, discover()), process_product, _FakeBrowser, workers=1, journal=second)
+    assert sorted(processed) == listing, f"processed {sorted(processed)}"
+    assert second.unfinished() is None and second.unfinished_source() is None, "finished job still offered for resume"
+
+
+class _CapturingBrowser:
+    """Stands in for Chrome after it loaded ``/img/<n>.jpg`` images of ``size`` bytes each."""
+
+    def __init__(self, size):
+        self.size = size
+        self.loaded = []
+
+    def get_log(self, kind):
+        events = []
+        for rid, url in enumerate(self.loaded):
+            events.append({"method": "Network.responseReceived",
+                           "params": {"requestId": str(rid), "type": "Image", "response": {"url": url, "status": 200}}})
+            events.append({"method": "Network.loadingFinished", "params": {"requestId": str(rid)}})
+        self.loaded = []
+        return [{"message": json.dumps({"message": event})} for event in events]
+
+    def execute_cdp_cmd(self, command, params):
+        return {"base64Encoded": False, "body": "x" * self.size}
+
+    def quit(self):
+        pass
+
+
+def check_capture_release(tmp):
+    """Captured bodies are dropped with their product's job, whatever became of it, and stay within budget."""
+    from scrap_common import capture, workers
+    config.CAPTURE = True
+    config.CAPTURE_MAX_MB = 1
+    config.RECYCLE_PAGES = 0
+    images = {f"https://store.example/p{n}": [f"https://cdn.example/img/{n}-{i}.jpg" for i in (1, 2)] for n in range(4)}
+    held = []
+
+    def process_product(driver, url):
+        driver.loaded = images[url]
+        capture.harvest(driver, images[url])
+        held.append(capture._captured_bytes)
+        if url.endswith("p1"):
+            raise ValueError("extraction failed")
+        if url.endswith("p2"):
+            return None
+        return lambda: capture.take(images[url][0])  # the second image is filtered out, never taken
+
+    workers.run_pool(list(images), process_product, lambda: _CapturingBrowser(600 * 1024), workers=1)
+    assert max(held) <= 1024 * 1024, f"held {max(held)} bytes, over the 1 MB budget"
+    assert not capture._captured and capture._captured_bytes == 0, f"{len(capture._captured)} bodies left behind"
+
+
+CHECKS = {name[len("check_"):]: fn for name, fn in globals().items() if name.startswith("check_")}
+
+
+def main():
+    names = sys.argv[1:] or list(CHECKS)
+    unknown = [name for name in names if name not in CHECKS]
+    if unknown:
+        sys.exit(f"Unknown checks: {', '.join(unknown)} (have: {', '.join(CHECKS)})")
+    config.METRICS = False  # keep the checks out of the real metrics directory
+    for name in names:
+        with tempfile.TemporaryDirectory(prefix=f"check-{name}-") as tmp:
+            CHECKS[name](tmp)
+        print(f"✔ {name}")
+
+
+if __name__ == "__main__":
+    main()
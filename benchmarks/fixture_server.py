@@ -0,0 +1,448 @@
+"""Local stand-in for the sites we scrape, for offline benchmarks.
+
+Serves synthetic product pages with the same markup our extractors look for,
+plus the endpoints around them, from one HTTP server:
+
+* ``/cullen/<n>``: Cullen's ``section.details.svelte-jiyox7`` / ``img.content.image.svelte-zka3ay``
+* ``/qd/<n>``: Quality Diamonds' ``zoom-gallery`` slides, thumbnails, ``Magic360`` spin and video
+* ``/products/melanie-<n>``: Melaniecasey's ``sliding-images pinchable-container`` gallery
+* ``/products/porter-<n>``: a Shopify theme ``product-gallery`` as on PorterLyons
+* ``/products/<handle>.js`` and ``/collections/<site>/products.json``: the Shopify JSON API
+* ``/collections/<site>``: a listing that loads more products as it is scrolled
+  (``porter``: paginated with ``?page=N`` and ``rel=next`` instead)
+* ``/robots.txt``, ``/sitemap.xml`` and ``/sitemap_products_1.xml``: the porter store's sitemaps,
+  where the first ``--changed`` products have a ``<lastmod>`` of the server's start time
+* ``/cdn/shop/files/<name>.jpg?width=<w>``: the image CDN, honouring ``width``
+
+With ``--http2`` the same routes are served over cleartext HTTP/2 with prior
+knowledge (h2c, needs the ``h2`` package), as ``SCRAP_HTTP2_PRIOR_KNOWLEDGE=1``
+makes the async download engine speak.
+
+The CDN can be slowed down (latency, per-connection bandwidth) and made to
+fail a share of requests, e.g.::
+
+    python benchmarks/fixture_server.py --port 8800 --latency 0.08 --bandwidth 2000 --error-rate 0.05
+"""
+import argparse
+import hashlib
+import io
+import json
+import random
+import re
+import socketserver
+import threading
+import time
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from PIL import Image
+
+SITES = ("cullen", "qd", "melanie", "porter")
+CHUNK = 16 * 1024
+MAX_WIDTH = 2400
+DEFAULT_WIDTH = 1200
+# Products appended each time the listing is scrolled to the bottom
+LISTING_BATCH = 24
+
+
+class Settings:
+    def __init__(self, products=50, images=6, latency=0.0, page_latency=0.0, bandwidth=0,
+                 error_rate=0.0, error_status=503, webp_share=0.25, changed=0, seed=1):
+        self.products = products
+        self.images = images
+        self.latency = latency
+        self.page_latency = page_latency
+        self.bandwidth = bandwidth * 1024  # KB/s per connection, 0 is unlimited
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.webp_share = webp_share
+        self.changed = changed
+        self.started = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def should_fail(self):
+        if not self.error_rate:
+            return False
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+
+@lru_cache(maxsize=16)
+def _image_bytes(width, fmt):
+    """Noisy (so it compresses like a photo) ``width`` x 3/4 ``width`` image."""
+    height = width * 3 // 4
+    noise = Image.effect_noise((width, height), 40)
+    img = Image.merge("RGB", (noise, noise.rotate(180), noise.transpose(Image.Transpose.FLIP_LEFT_RIGHT)))
+    out = io.BytesIO()
+    img.save(out, "WEBP" if fmt == "webp" else "JPEG", quality=85)
+    return out.getvalue()
+
+
+def _is_webp(name, share):
+    return int(hashlib.md5(name.encode()).hexdigest()[:8], 16) / 0xFFFFFFFF < share
+
+
+def _cdn(name, width):
+    return f"/cdn/shop/files/{name}.jpg?width={width}"
+
+
+def _srcset(name):
+    return ", ".join(f"{_cdn(name, w)} {w}w" for w in (400, 800, 1600, 2048))
+
+
+def _image_names(site, n, count):
+    return [f"{site}-{n}-{i}" for i in range(1, count + 1)]
+
+
+def cullen_page(n, s):
+    imgs = "\n".join(
+        f'<div class="slide"><img class="content image svelte-zka3ay" src="{_cdn(name, 800)}" srcset="{_srcset(name)}"></div>'
+        for name in _image_names("cullen", n, s.images))
+    return f"""<section class="details svelte-jiyox7"><h1>Cullen Ring {n}</h1><p>Oval solitaire</p></section>
+<div class="gallery">{imgs}</div>"""
+
+
+def qd_page(n, s):
+    names = _image_names("qd", n, s.images)
+    thumbs = "".join(f'<a class="mz-thumb" href="{_cdn(name, 2048)}"><img src="{_cdn(name, 150)}"></a>' for name in names)
+    slides = "".join(f'<div class="zoom-gallery-slide"><figure><img src="{_cdn(name, 800)}" srcset="{_srcset(name)}"></figure></div>'
+                     for name in names)
+    spin = " ".join(_cdn(f"qd-{n}-spin-{i}", DEFAULT_WIDTH) for i in range(1, 13))
+    return f"""<h1>Quality Diamonds {n}</h1>
+<div class="zoom-gallery">
+{slides}
+<div class="zoom-gallery-slide video-slide"><iframe src="/embed/qd-{n}"></iframe></div>
+<a class="Magic360" href="#" data-magic360-options="images: {spin}; columns: 12"></a>
+<div class="thumbs">{thumbs}</div>
+</div>"""
+
+
+def melanie_page(n, s):
+    slides = "".join(f'<div data-index="{i}"><img src="{_cdn(name, 800)}" srcset="{_srcset(name)}"></div>'
+                     for i, name in enumerate(_image_names("melanie", n, s.images)))
+    return f"""<h1>Melanie Casey Ring {n}</h1>
+<div class="image-container sliding-images pinchable-container">{slides}</div>"""
+
+
+def porter_page(n, s):
+    imgs = "".join(f'<img src="{_cdn(name, 800)}" srcset="{_srcset(name)}">' for name in _image_names("porter", n, s.images))
+    return f"""<h1>Porter Lyons Ring {n}</h1>
+<div class="product-gallery">{imgs}</div>
+<ul class="thumbnails"><li><img src="/cdn/shop/files/logo.svg"></li></ul>"""
+
+
+def listing_page(site, s):
+    first = "".join(f'<a class="full-unstyled-link" href="/products/{site}-{n}">{site} {n}</a>'
+                    for n in range(1, min(LISTING_BATCH, s.products) + 1))
+    # More products come in as the page is scrolled, like the themes' infinite scroll
+    return f"""<h1>{site} collection</h1>
+<div id="grid">{first}</div>
+<div style="height:2000px"></div>
+<script>
+let page = 1, loading = false;
+window.addEventListener('scroll', async () => {{
+  if (loading || window.innerHeight + window.scrollY < document.body.scrollHeight - 400) return;
+  loading = true;
+  const r = await fetch('/collections/{site}?fragment=' + (page + 1));
+  const html = await r.text();
+  if (html) {{ page++; document.getElementById('grid').insertAdjacentHTML('beforeend', html); }}
+  loading = false;
+}});
+</script>"""
+
+
+def paginated_listing(site, page, s):
+    pages = max(1, -(-s.products // LISTING_BATCH))
+    grid = listing_fragment(site, page, s)
+    # Windowed pagination like the Shopify themes: a few numbers around the current page
+    numbers = "".join(f'<a href="/collections/{site}?page={n}">{n}</a>'
+                      for n in range(max(1, page - 2), min(pages, page + 2) + 1))
+    nxt = f'<a rel="next" href="/collections/{site}?page={page + 1}">Next</a>' if page < pages else ""
+    return f"""<h1>{site} collection</h1>
+<div class="grid">{grid}</div>
+<nav class="pagination">{numbers}{nxt}</nav>"""
+
+
+def listing_fragment(site, page, s):
+    start = (page - 1) * LISTING_BATCH + 1
+    return "".join(f'<a class="full-unstyled-link" href="/products/{site}-{n}">{site} {n}</a>'
+                   for n in range(start, min(start + LISTING_BATCH - 1, s.products) + 1))
+
+
+def sitemap_index(base):
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+<sitemap><loc>{base}/sitemap_pages_1.xml</loc></sitemap>
+<sitemap><loc>{base}/sitemap_products_1.xml</loc></sitemap>
+</sitemapindex>"""
+
+
+def product_sitemap(base, s):
+    entries = []
+    for n in range(1, s.products + 1):
+        lastmod = s.started if n <= s.changed else "2024-01-01T00:00:00Z"
+        images = "".join(f"<image:image><image:loc>{base}{_cdn(name, DEFAULT_WIDTH)}</image:loc></image:image>"
+                         for name in _image_names("porter", n, 1))
+        entries.append(f"<url><loc>{base}/products/porter-{n}</loc><lastmod>{lastmod}</lastmod>{images}</url>")
+    return ('<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9"'
+            ' xmlns:image="http://www.google.com/schemas/sitemap-image/1.1">\n' + "\n".join(entries) + "\n</urlset>")
+
+
+PAGES = {"cullen": cullen_page, "qd": qd_page, "melanie": melanie_page, "porter": porter_page}
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    settings = Settings()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type="text/html; charset=utf-8", headers=None, throttle=False):
+        if isinstance(body, str):
+            body = body.encode()
+        headers = {"Content-Type": content_type, "Content-Length": str(len(body)), **(headers or {})}
+        if self.command == "HEAD":
+            body = b""
+        self._write(status, headers, body, self.settings.bandwidth if throttle else 0)
+
+    def _write(self, status, headers, body, bandwidth):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        for start in range(0, len(body), CHUNK):
+            chunk = body[start:start + CHUNK]
+            self.wfile.write(chunk)
+            if bandwidth:
+                time.sleep(len(chunk) / bandwidth)
+
+    def _html(self, inner, title="fixture"):
+        self._send(200, f"<!doctype html><html><head><title>{title}</title></head><body>{inner}</body></html>")
+
+    def _product(self, site, n):
+        s = self.settings
+        if not 1 <= n <= s.products:
+            return self._send(404, "not found")
+        time.sleep(s.page_latency)
+        self._html(PAGES[site](n, s), f"{site} {n}")
+
+    def _cdn(self, name, query):
+        s = self.settings
+        time.sleep(s.latency)
+        if s.should_fail():
+            return self._send(s.error_status, "injected error", "text/plain", {"Retry-After": "1"})
+        try:
+            width = min(MAX_WIDTH, int(query.get("width", [DEFAULT_WIDTH])[0]) or DEFAULT_WIDTH)
+        except ValueError:
+            width = DEFAULT_WIDTH
+        fmt = "webp" if _is_webp(name, s.webp_share) else "jpeg"
+        self._send(200, _image_bytes(width, fmt), f"image/{fmt}", {"Cache-Control": "max-age=3600"}, throttle=True)
+
+    def _shopify_product(self, handle):
+        site, _, n = handle.rpartition("-")
+        if site not in ("melanie", "porter") or not n.isdigit() or not 1 <= int(n) <= self.settings.products:
+            return self._send(404, "not found")
+        time.sleep(self.settings.page_latency)
+        images = [_cdn(name, DEFAULT_WIDTH) for name in _image_names(site, int(n), self.settings.images)]
+        self._send(200, json.dumps({"title": f"{site.title()} Ring {n}", "images": images}), "application/json")
+
+    def _products_json(self, site, query):
+        s = self.settings
+        limit = int(query.get("limit", [30])[0])
+        page = int(query.get("page", [1])[0])
+        start = (page - 1) * limit + 1
+        handles = [{"handle": f"{site}-{n}"} for n in range(start, min(start + limit - 1, s.products) + 1)]
+        time.sleep(s.page_latency)
+        self._send(200, json.dumps({"products": handles}), "application/json")
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        path, query = parsed.path.rstrip("/"), parse_qs(parsed.query)
+        if path.startswith("/cdn/shop/files/"):
+            return self._cdn(path.rsplit("/", 1)[1].rsplit(".", 1)[0], query)
+        match = re.fullmatch(r"/products/([\w-]+)\.js", path)
+        if match:
+            return self._shopify_product(match.group(1))
+        match = re.fullmatch(r"/products/(melanie|porter)-(\d+)", path) or re.fullmatch(r"/(cullen|qd)/(\d+)", path)
+        if match:
+            return self._product(match.group(1), int(match.group(2)))
+        match = re.fullmatch(r"/collections/(\w+)/products\.json", path)
+        if match and match.group(1) in SITES:
+            return self._products_json(match.group(1), query)
+        match = re.fullmatch(r"/collections/(\w+)", path)
+        if match and match.group(1) in SITES:
+            time.sleep(self.settings.page_latency)
+            if "fragment" in query:
+                return self._send(200, listing_fragment(match.group(1), int(query["fragment"][0]), self.settings))
+            if match.group(1) == "porter":
+                page = int(query.get("page", [1])[0])
+                return self._html(paginated_listing("porter", page, self.settings))
+            return self._html(listing_page(match.group(1), self.settings))
+        base = f"http://{self.headers.get('Host')}"
+        if path == "/robots.txt":
+            return self._send(200, f"User-agent: *\nSitemap: {base}/sitemap.xml\n", "text/plain")
+        if path == "/sitemap.xml":
+            return self._send(200, sitemap_index(base), "application/xml")
+        if path == "/sitemap_products_1.xml":
+            return self._send(200, product_sitemap(base, self.settings), "application/xml")
+        if path.startswith("/embed/"):
+            return self._html("<p>video</p>")
+        self._send(404, "not found", "text/plain")
+
+    do_HEAD = do_GET
+
+
+class _H2Exchange(Handler):
+    """One request of an HTTP/2 connection, routed by ``Handler`` like an HTTP/1.1 one."""
+
+    def __init__(self, connection, stream_id, headers):
+        self.connection = connection
+        self.stream_id = stream_id
+        self.command = headers[":method"]
+        self.path = headers[":path"]
+        self.headers = {"Host": headers.get(":authority", "")}
+        self.request_version = "HTTP/2"
+
+    def _write(self, status, headers, body, bandwidth):
+        self.connection.respond(self.stream_id, status, headers, body, bandwidth)
+
+
+class _H2Connection:
+    """Server side of one h2c connection: a reader loop plus a thread per request."""
+
+    def __init__(self, sock, exchange):
+        import h2.config
+        import h2.connection
+        self.sock = sock
+        self.exchange = exchange  # _H2Exchange subclass carrying the settings
+        self.h2 = h2.connection.H2Connection(h2.config.H2Configuration(client_side=False, header_encoding="utf-8"))
+        self.cond = threading.Condition()  # guards self.h2; notified when flow-control windows may have grown
+        self.closed = False
+
+    def _flush(self):
+        self.sock.sendall(self.h2.data_to_send())
+
+    def run(self):
+        import h2.events
+        with self.cond:
+            self.h2.initiate_connection()
+            self._flush()
+        requests = {}
+        try:
+            while True:
+                data = self.sock.recv(65536)
+                if not data:
+                    return
+                with self.cond:
+                    events = self.h2.receive_data(data)
+                    self._flush()
+                    self.cond.notify_all()
+                for event in events:
+                    if isinstance(event, h2.events.RequestReceived):
+                        requests[event.stream_id] = dict(event.headers)
+                    elif isinstance(event, h2.events.StreamEnded) and event.stream_id in requests:
+                        exchange = self.exchange(self, event.stream_id, requests.pop(event.stream_id))
+                        threading.Thread(target=exchange.do_GET, daemon=True).start()
+                    elif isinstance(event, h2.events.ConnectionTerminated):
+                        return
+        except OSError:
+            return
+        finally:
+            with self.cond:
+                self.closed = True
+                self.cond.notify_all()
+
+    def respond(self, stream_id, status, headers, body, bandwidth):
+        import h2.exceptions
+        try:
+            with self.cond:
+                self.h2.send_headers(stream_id, [(":status", str(status)), *((k.lower(), v) for k, v in headers.items())],
+                                     end_stream=not body)
+                self._flush()
+            sent = 0
+            while sent < len(body):
+                with self.cond:
+                    while not self.closed and min(self.h2.local_flow_control_window(stream_id),
+                                                  self.h2.max_outbound_frame_size) <= 0:
+                        self.cond.wait()
+                    if self.closed:
+                        return
+                    size = min(CHUNK, self.h2.local_flow_control_window(stream_id), self.h2.max_outbound_frame_size)
+                    self.h2.send_data(stream_id, body[sent:sent + size], end_stream=sent + size >= len(body))
+                    self._flush()
+                sent += size
+                if bandwidth:
+                    time.sleep(size / bandwidth)
+        except (h2.exceptions.StreamClosedError, h2.exceptions.ProtocolError, OSError):
+            return  # the client reset the stream or went away
+
+
+class _H2Server(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+def _serve_h2(port, settings):
+    exchange = type("FixtureH2Exchange", (_H2Exchange,), {"settings": settings})
+
+    class Connection(socketserver.BaseRequestHandler):
+        def handle(self):
+            _H2Connection(self.request, exchange).run()
+
+    return _H2Server(("127.0.0.1", port), Connection)
+
+
+def serve(port=0, settings=None, http2=False):
+    """Start the server in a background thread; returns it (``server.server_port`` is the port).
+
+    ``http2`` serves h2c with prior knowledge instead of HTTP/1.1.
+    """
+    settings = settings or Settings()
+    if http2:
+        server = _serve_h2(port, settings)
+        server.server_port = server.server_address[1]
+    else:
+        handler = type("FixtureHandler", (Handler,), {"settings": settings})
+        server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+        server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def add_arguments(parser):
+    parser.add_argument("--products", type=int, default=50, help="products per site")
+    parser.add_argument("--images", type=int, default=6, help="gallery images per product")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before each CDN response")
+    parser.add_argument("--page-latency", type=float, default=0.0, help="seconds before each page/API response")
+    parser.add_argument("--bandwidth", type=int, default=0, help="CDN KB/s per connection (0: unlimited)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of CDN requests that fail")
+    parser.add_argument("--error-status", type=int, default=503, help="status of injected failures")
+    parser.add_argument("--webp-share", type=float, default=0.25, help="share of images served as WebP")
+    parser.add_argument("--changed", type=int, default=0, help="products whose sitemap lastmod is the server's start")
+
+
+def settings_from(args):
+    return Settings(args.products, args.images, args.latency, args.page_latency, args.bandwidth,
+                    args.error_rate, args.error_status, args.webp_share, args.changed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--http2", action="store_true", help="serve h2c (HTTP/2 with prior knowledge) instead of HTTP/1.1")
+    add_arguments(parser)
+    args = parser.parse_args()
+    server = serve(args.port, settings_from(args), args.http2)
+    print(f"Fixture sites on http://127.0.0.1:{server.server_port}/{' over h2c' if args.http2 else ''} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""Drive each scraper end to end against the local fixture sites and report throughput.
+
+Every scenario (site x mode x download engine) runs the real script in a
+fresh process, answering its prompts on stdin, with its own image store,
+journal, rate state and metrics directory, so runs do not warm each other up.
+The report gives products/min, images/s, peak RSS and the p50/p99 of every
+stage recorded by ``scrap_common/metrics.py``::
+
+    python benchmarks/run.py --sites melanie,porter --modes api,static --engines threads,async
+    python benchmarks/run.py --latency 0.1 --bandwidth 1500 --json after.json --baseline before.json
+
+Modes: ``browser`` (Chrome, needs chromedriver), ``static`` (``SCRAP_STATIC_FIRST=1``)
+and ``api`` (Shopify JSON endpoints, Melaniecasey and PorterLyons only).
+The ``links`` site runs ``Malaniecasey_get_link.py`` on the scrolling listing.
+"""
+import argparse
+import glob
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import fixture_server
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Script and the stdin answering its prompts, for product URLs ``urls`` saved under ``folder``
+SCRIPTS = {
+    "cullen": ("Cullen_Diamonds/cullen_image_scrap.py", lambda base, urls, folder: [folder, *urls, "no"]),
+    "qd": ("Quality_Diamonds/quality_diamonds_image_scrap.py", lambda base, urls, folder: [*urls, "no", folder]),
+    "melanie": ("Melaniecasey/Malaniecasey_image_scrap.py", lambda base, urls, folder: [*urls, "no", folder]),
+    "porter": ("PortLyons/PorterLyons_image_scrap_two.py", lambda base, urls, folder: [folder, *urls, ""]),
+    "links": ("Melaniecasey/Malaniecasey_get_link.py", lambda base, urls, folder: [f"{base}/collections/melanie"]),
+}
+PRODUCT_PATHS = {"cullen": "/cullen/{}", "qd": "/qd/{}", "melanie": "/products/melanie-{}", "porter": "/products/porter-{}"}
+API_SITES = ("melanie", "porter", "links")
+
+
+def _env(workdir, mode, engine):
+    env = dict(os.environ)
+    env.update({
+        "HOME": workdir,  # get_link saves to ~/Desktop/links.txt
+        "SCRAP_STORE_DIR": os.path.join(workdir, "store"),
+        "SCRAP_JOURNAL": os.path.join(workdir, "journal.sqlite"),
+        "SCRAP_RATE_STATE": os.path.join(workdir, "rates.json"),
+        "SCRAP_METRICS_DIR": os.path.join(workdir, "metrics"),
+        # Keep using the chromedriver already resolved on this machine
+        "SCRAP_DRIVER_CACHE": os.environ.get("SCRAP_DRIVER_CACHE", os.path.join(
+            os.path.expanduser("~"), ".product_scrap", "chromedriver.path")),
+        "SCRAP_DOWNLOAD_ENGINE": engine,
+        "SCRAP_METRICS": "1",
+        "SCRAP_SHOPIFY_API": "1" if mode == "api" else "0",
+        "SCRAP_STATIC_FIRST": "1" if mode == "static" else "0",
+    })
+    return env
+
+
+def _has_psutil():
+    try:
+        import psutil  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _peak_rss_mb(proc, stop, result):
+    """Poll the RSS of the scraper and its Chrome processes (needs psutil)."""
+    import psutil
+    try:
+        root = psutil.Process(proc.pid)
+    except psutil.Error:
+        return
+    while not stop.is_set():
+        try:
+            rss = sum(p.memory_info().rss for p in [root] + root.children(recursive=True))
+        except psutil.Error:
+            rss = 0
+        result[0] = max(result[0], rss / 2 ** 20)
+        stop.wait(0.2)
+
+
+def run_scenario(site, mode, engine, base, products, keep=False):
+    workdir = tempfile.mkdtemp(prefix=f"bench-{site}-{mode}-{engine}-")
+    folder = os.path.join(workdir, "out")
+    urls = [base + PRODUCT_PATHS[site].format(n) for n in range(1, products + 1)] if site in PRODUCT_PATHS else []
+    script, answers = SCRIPTS[site]
+    log_path = os.path.join(workdir, "output.log")
+    with open(log_path, "w", encoding="utf-8") as log:
+        started = time.monotonic()
+        proc = subprocess.Popen([sys.executable, os.path.join(REPO, script)], cwd=workdir, env=_env(workdir, mode, engine),
+                                stdin=subprocess.PIPE, stdout=log, stderr=subprocess.STDOUT, text=True)
+        stop, rss = threading.Event(), [0.0]
+        poller, rss_source = None, "scraper only"
+        if _has_psutil():
+            poller = threading.Thread(target=_peak_rss_mb, args=(proc, stop, rss), daemon=True)
+            poller.start()
+            rss_source = "process tree"
+        proc.stdin.write("\n".join(answers(base, urls, folder)) + "\n")
+        proc.stdin.close()
+        # wait4 gives this child's own peak RSS when psutil is not there to poll the tree
+        _, status, usage = os.wait4(proc.pid, 0)
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        elapsed = time.monotonic() - started
+        stop.set()
+    if poller is not None:
+        poller.join()
+    peak = rss[0] if rss[0] else usage.ru_maxrss / 1024
+    counters, spans = read_metrics(os.path.join(workdir, "metrics"))
+    if site == "links":
+        done = counters.get("links_found", 0)
+    else:
+        done = counters.get('products{result="extracted"}', 0)
+    images = counters.get('images{result="saved"}', 0)
+    if proc.returncode == 0 and not keep:
+        shutil.rmtree(workdir, ignore_errors=True)
+        log_path = None
+    return {
+        "scenario": f"{site}/{mode}/{engine}", "exit": proc.returncode, "seconds": round(elapsed, 2),
+        "products": done, "images": images,
+        "products_per_min": round(done / elapsed * 60, 1) if elapsed else 0,
+        "images_per_s": round(images / elapsed, 2) if elapsed else 0,
+        "peak_rss_mb": round(peak, 1), "rss_source": rss_source,
+        "stages": spans, "log": log_path,
+    }
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, int(round(q * len(values) + 0.5)) - 1))]
+
+
+def read_metrics(metrics_dir):
+    """Counters from the run's ``.prom`` file and p50/p99 per span from its JSONL trace."""
+    counters = {}
+    for path in glob.glob(os.path.join(metrics_dir, "*.prom")):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                name, _, value = line.rpartition(" ")
+                if name.startswith("scrap_") and "_total" in name:
+                    key = name[len("scrap_"):].replace("_total", "", 1)
+                    counters[key] = counters.get(key, 0) + float(value)
+    durations = {}
+    for path in glob.glob(os.path.join(metrics_dir, "*.jsonl")):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                durations.setdefault(record["span"], []).append(record["seconds"])
+    spans = {name: {"n": len(v), "p50": round(_percentile(v, 0.5), 4), "p99": round(_percentile(v, 0.99), 4)}
+             for name, v in sorted(durations.items())}
+    return counters, spans
+
+
+def _delta(now, before):
+    if not before:
+        return ""
+    return f" ({(now - before) / before:+.0%})"
+
+
+def report(results, baseline=None):
+    previous = {r["scenario"]: r for r in baseline or []}
+    for r in results:
+        old = previous.get(r["scenario"], {})
+        status = "✔" if r["exit"] == 0 else f"✘ exit {r['exit']}"
+        print(f"\n{status} {r['scenario']}: {r['products']:.0f} products, {r['images']:.0f} images in {r['seconds']}s")
+        print(f"    {r['products_per_min']} products/min{_delta(r['products_per_min'], old.get('products_per_min'))}, "
+              f"{r['images_per_s']} images/s{_delta(r['images_per_s'], old.get('images_per_s'))}, "
+              f"peak RSS {r['peak_rss_mb']} MB ({r['rss_source']})")
+        for name, stage in r["stages"].items():
+            before = old.get("stages", {}).get(name, {}).get("p50")
+            print(f"    {name:<18} n={stage['n']:<5} p50={stage['p50'] * 1000:8.1f} ms{_delta(stage['p50'], before)}"
+                  f"  p99={stage['p99'] * 1000:8.1f} ms")
+        if r["exit"] != 0:
+            print(f"    ↳ see {r['log']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sites", default="cullen,qd,melanie,porter,links")
+    parser.add_argument("--modes", default="browser,static,api")
+    parser.add_argument("--engines", default="threads,async")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--baseline", help="results of an earlier --json run to compare with")
+    parser.add_argument("--keep", action="store_true", help="keep the downloads and logs of successful runs")
+    fixture_server.add_arguments(parser)
+    args = parser.parse_args()
+
+    server = fixture_server.serve(0, fixture_server.settings_from(args))
+    base = f"http://127.0.0.1:{server.server_port}"
+    print(f"Fixture sites on {base}")
+    results = []
+    try:
+        for site in args.sites.split(","):
+            for mode in args.modes.split(","):
+                if (mode == "api" and site not in API_SITES) or (mode == "static" and site == "links"):
+                    continue  # no such path for this script
+                # Link discovery downloads nothing, one engine is enough
+                for engine in args.engines.split(",")[:1] if site == "links" else args.engines.split(","):
+                    print(f"▶ {site}/{mode}/{engine} ...", flush=True)
+                    results.append(run_scenario(site, mode, engine, base, args.products, args.keep))
+    finally:
+        server.shutdown()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    report(results, baseline)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults saved to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
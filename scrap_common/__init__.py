@@ -0,0 +1 @@
+"""Helpers shared by the per-site scrapers (downloads, browser setup, ...)."""
@@ -0,0 +1,157 @@
+"""asyncio download engine using httpx with HTTP/2 multiplexing.
+
+Enabled with ``SCRAP_DOWNLOAD_ENGINE=async``. All images of a product (gallery
+and 360-spin frames alike) go through one ``httpx.AsyncClient`` so each CDN
+host is served by a single multiplexed HTTP/2 connection, and a semaphore
+bounds how many requests are in flight. Bodies are streamed through the same
+``ImageSink`` and saved by the same helpers (image store included) as the
+thread-pool engine, so output is identical.
+"""
+import asyncio
+import contextlib
+import os
+import time
+from urllib.parse import urlparse
+
+import httpx
+
+from . import config, journal, metrics, ratelimit, retry
+from .downloader import (
+    CHUNK_SIZE, FIRST_CHUNK_SIZE, HEADERS, ImageSink, evict_cache, keep_download, number_results, plan_download,
+    record_pending, record_result, revalidated,
+)
+
+
+def _http2_available():
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def make_client(timeout=60):
+    limits = httpx.Limits(max_connections=config.POOL_SIZE, max_keepalive_connections=config.POOL_SIZE)
+    http2 = _http2_available()
+    return httpx.AsyncClient(
+        http1=not (http2 and config.HTTP2_PRIOR_KNOWLEDGE),
+        http2=http2,
+        headers=HEADERS,
+        limits=limits,
+        timeout=timeout,
+        follow_redirects=True,
+    )
+
+
+@contextlib.asynccontextmanager
+async def _rate_limited_stream(client, url, headers):
+    sent = time.monotonic()
+    try:
+        async with client.stream("GET", url, headers=headers) as r:
+            ratelimit.feedback(url, r.status_code, time.monotonic() - sent, r.headers.get("Retry-After"))
+            yield r
+    except httpx.TransportError:
+        ratelimit.feedback(url, failed=True)
+        raise
+
+
+async def _aiter_chunks(response):
+    """``downloader.iter_chunks`` for an httpx response: a first chunk as soon as ``FIRST_CHUNK_SIZE`` arrived."""
+    size, pending, buffered = FIRST_CHUNK_SIZE, [], 0
+    async for data in response.aiter_bytes():
+        pending.append(data)
+        buffered += len(data)
+        if buffered >= size:
+            yield b"".join(pending)
+            size, pending, buffered = CHUNK_SIZE, [], 0
+    if pending:
+        yield b"".join(pending)
+
+
+async def download_image(client, semaphore, idx, url, entry, headers, folder_path, min_size):
+    """Async twin of ``downloader.download_image``."""
+    wait = ratelimit.reserve(url)
+    await asyncio.sleep(wait)
+    if wait > 0:
+        metrics.observe("rate_wait", wait, url, page=False)
+    with metrics.span("image_get", url=url, host=urlparse(url).netloc) as fields:
+        async with semaphore, _rate_limited_stream(client, url, headers) as r:
+            fields["status"] = r.status_code
+            if r.status_code == 304 and entry is not None:
+                return await asyncio.to_thread(revalidated, idx, url, r, entry, folder_path, min_size)
+            r.raise_for_status()
+            sink = ImageSink(idx, folder_path, min_size, r.headers.get("Content-Length"))
+            try:
+                async for chunk in _aiter_chunks(r):
+                    if not sink.feed(chunk):
+                        break
+            except BaseException:
+                sink.discard()
+                raise
+            finally:
+                fields["bytes"] = sink.received
+                metrics.count("image_bytes", sink.received)
+    # Conversion and store work runs off the event loop so fetches keep flowing
+    return await asyncio.to_thread(lambda: keep_download(url, r, sink.finish()))
+
+
+async def _download(client, semaphore, idx, url, folder_path, min_size, deadline=None):
+    result, entry, headers = await asyncio.to_thread(plan_download, idx, url, folder_path, min_size)
+    if result is not None:
+        return result
+
+    async def fetch():
+        result = await download_image(client, semaphore, idx, url, entry, headers, folder_path, min_size)
+        if result is None:
+            result = await download_image(client, semaphore, idx, url, None, {}, folder_path, min_size)
+        return result
+
+    return await retry.call_async(fetch, url, deadline)
+
+
+async def _fetch_and_save(client, semaphore, idx, url, folder_path, min_size, record, deadline=None):
+    started = time.monotonic()
+    try:
+        result = await _download(client, semaphore, idx, url, folder_path, min_size, deadline)
+    except Exception as e:
+        record_result(record, idx, url, started, error=e)
+        raise
+    record_result(record, idx, url, started, result)
+    return result
+
+
+def _outcome(result):
+    def get():
+        if isinstance(result, BaseException):
+            raise result
+        return result
+    return get
+
+
+async def download_groups_async(groups, min_size=0, compact=False, timeout=60, record=None):
+    semaphore = asyncio.Semaphore(max(1, config.ASYNC_CONCURRENCY))
+    deadline = time.monotonic() + config.PRODUCT_DEADLINE
+    async with make_client(timeout) as client:
+        tasks = []
+        for image_urls, folder_path in groups:
+            os.makedirs(folder_path, exist_ok=True)
+            record_pending(record, image_urls)
+            tasks.append(asyncio.gather(
+                *(_fetch_and_save(client, semaphore, idx, url, folder_path, min_size, record, deadline)
+                  for idx, url in enumerate(image_urls, 1)),
+                return_exceptions=True,
+            ))
+        group_results = await asyncio.gather(*tasks)
+    results = [
+        number_results(image_urls, [_outcome(r) for r in results], folder_path, compact)
+        for (image_urls, folder_path), results in zip(groups, group_results)
+    ]
+    evict_cache()
+    return results
+
+
+def download_groups(groups, min_size=0, compact=False, timeout=60):
+    """Synchronous entry point used by ``downloader.download_groups``."""
+    # The journal recorder is per thread, so pick it up before entering the loop
+    record = journal.image_recorder()
+    return asyncio.run(download_groups_async(groups, min_size, compact, timeout, record))
@@ -0,0 +1,137 @@
+"""Chrome profile shared by the scrapers: headless, eager and without the noise.
+
+``driver.get`` with Chrome's defaults waits for fonts, analytics, embedded
+videos and every full-size image, none of which the extraction needs (the
+images are downloaded separately anyway). ``get_driver`` returns as soon as
+the DOM is parsed (``config.PAGE_LOAD_STRATEGY``) and tells Chrome, through
+DevTools ``Network.setBlockedURLs``, not to request the categories listed in
+``config.BLOCK``. A site that needs one of those requests passes it in
+``allow``.
+
+The chromedriver binary is resolved by webdriver-manager once and the path
+remembered on disk, so later runs start offline and without the lookup.
+"""
+import os
+import threading
+
+from selenium import webdriver
+from selenium.common.exceptions import SessionNotCreatedException
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
+from webdriver_manager.chrome import ChromeDriverManager
+
+from . import capture, config, metrics
+
+# Chrome URL patterns ("*" matches anything) per blockable category
+BLOCK_PATTERNS = {
+    "trackers": [
+        "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*", "*googleadservices.com*",
+        "*connect.facebook.net*", "*facebook.com/tr*", "*hotjar.com*", "*clarity.ms*", "*klaviyo.com*",
+        "*analytics.tiktok.com*", "*ct.pinterest.com*", "*bat.bing.com*", "*segment.com*", "*segment.io*",
+        "*omnisrc.com*", "*nr-data.net*", "*newrelic.com*", "*gorgias.chat*", "*tidio.co*", "*zdassets.com*",
+        "*shopify.com/shopifycloud/shopify-analytics*", "*monorail-edge.shopifysvc.com*",
+    ],
+    "fonts": [
+        "*.woff*", "*.ttf*", "*.otf*", "*.eot*", "*fonts.googleapis.com*", "*fonts.gstatic.com*",
+        "*use.typekit.net*",
+    ],
+    "media": [
+        "*.mp4*", "*.webm*", "*.m3u8*", "*.mov*", "*youtube.com/embed*", "*player.vimeo.com*",
+        "*ytimg.com*",
+    ],
+    "images": [
+        "*.jpg*", "*.jpeg*", "*.png*", "*.gif*", "*.webp*", "*.avif*", "*.svg*", "*.ico*",
+    ],
+}
+
+
+def blocked_patterns(categories=None, allow=()):
+    """Patterns for ``categories`` (default ``config.BLOCK``) minus those containing an ``allow`` entry."""
+    patterns = []
+    for category in config.BLOCK if categories is None else categories:
+        patterns.extend(BLOCK_PATTERNS.get(category, []))
+    return [p for p in patterns if not any(a in p for a in allow)]
+
+
+_driver_path = None
+_path_lock = threading.Lock()
+
+
+def _cached_path():
+    try:
+        with open(config.DRIVER_CACHE, encoding="utf-8") as f:
+            path = f.read().strip()
+    except OSError:
+        return None
+    return path if path and os.path.exists(path) else None
+
+
+def driver_path(refresh=False):
+    """The chromedriver binary: ``config.CHROMEDRIVER``, the cached one, or a freshly resolved one."""
+    global _driver_path
+    if config.CHROMEDRIVER:
+        return config.CHROMEDRIVER
+    with _path_lock:
+        if not refresh:
+            _driver_path = _driver_path or _cached_path()
+        if _driver_path is None or refresh:
+            _driver_path = ChromeDriverManager().install()
+            try:
+                os.makedirs(os.path.dirname(config.DRIVER_CACHE), exist_ok=True)
+                with open(config.DRIVER_CACHE, "w", encoding="utf-8") as f:
+                    f.write(_driver_path)
+            except OSError:
+                pass
+        return _driver_path
+
+
+def chrome_options(headless=None, window_size="1400,1000"):
+    options = Options()
+    if config.HEADLESS if headless is None else headless:
+        options.add_argument("--headless=new")
+    options.page_load_strategy = config.PAGE_LOAD_STRATEGY
+    options.add_argument("--disable-blink-features=AutomationControlled")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument(f"--window-size={window_size}")
+    capture.enable(options)
+    return options
+
+
+def block_requests(driver, patterns):
+    """Stop ``driver`` from requesting URLs matching ``patterns`` (Chromium only)."""
+    if not patterns:
+        return
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+    except Exception as e:
+        print(f"  ⚠️ Could not block requests ({e!r}), loading everything.")
+
+
+def get_driver(page_load_timeout=60, allow=(), block=None, headless=None, window_size="1400,1000"):
+    """Launch Chrome with the shared profile.
+
+    ``block`` overrides the ``config.BLOCK`` categories and ``allow`` lists
+    URL fragments (e.g. ``"fonts.gstatic.com"``) the site needs loaded.
+    """
+    options = chrome_options(headless, window_size)
+    with metrics.span("driver_start"):
+        try:
+            driver = webdriver.Chrome(service=Service(driver_path()), options=options)
+        except SessionNotCreatedException:
+            if config.CHROMEDRIVER:
+                raise
+            # Chrome updated since the driver was cached: resolve a matching one
+            driver = webdriver.Chrome(service=Service(driver_path(refresh=True)), options=options)
+    driver.set_page_load_timeout(page_load_timeout)
+    block_requests(driver, blocked_patterns(block, allow))
+    return driver
+
+
+def load(driver, url):
+    """``driver.get(url)``, timed as the ``page_get`` span."""
+    kind = "static" if getattr(driver, "static", False) else "browser"
+    with metrics.span("page_get", url=url, driver=kind):
+        driver.get(url)
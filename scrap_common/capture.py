@@ -0,0 +1,139 @@
+"""Reuse the image bytes Chrome already downloaded while rendering a product.
+
+With ``SCRAP_CAPTURE=1`` Chrome records DevTools network events in its
+performance log. After a site has extracted its gallery URLs, ``harvest``
+looks up which of them the page loaded and copies their bodies out with
+``Network.getResponseBody``, while the page is still open. The downloader
+then takes them with ``take`` instead of fetching them again; URLs the
+browser never loaded are downloaded over HTTP as usual.
+
+Captures belong to the product being rendered (``product``, set by
+``workers.run_pool``) and whatever its download job did not take is dropped
+with ``release`` once the job is over, or straight away when there is no job.
+At most ``config.CAPTURE_MAX_MB`` of bodies are held at any time.
+"""
+import base64
+import contextlib
+import json
+import threading
+from collections import namedtuple
+
+from requests.structures import CaseInsensitiveDict
+
+from . import config, imageformat, resolver
+
+# Looks enough like a response for ImageSink and http_cache.validators
+Captured = namedtuple("Captured", "content headers")
+
+_captured = {}  # image url -> (product url, Captured)
+_captured_bytes = 0
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def enable(options):
+    """Turn on the performance log ``harvest`` reads (a no-op unless capture is enabled)."""
+    if config.CAPTURE:
+        options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+
+
+def _loaded_images(driver):
+    """``{url: (request_id, headers)}`` of images fully loaded since the last call."""
+    responses, finished = {}, set()
+    for entry in driver.get_log("performance"):
+        message = json.loads(entry["message"])["message"]
+        params = message.get("params", {})
+        if message.get("method") == "Network.responseReceived" and params.get("type") == "Image":
+            response = params["response"]
+            if response.get("status") == 200 and response.get("url", "").startswith("http"):
+                responses[params["requestId"]] = (response["url"], response.get("headers", {}))
+        elif message.get("method") == "Network.loadingFinished":
+            finished.add(params["requestId"])
+    return {url: (rid, headers) for rid, (url, headers) in responses.items() if rid in finished}
+
+
+def _body(driver, request_id):
+    body = driver.execute_cdp_cmd("Network.getResponseBody", {"requestId": request_id})
+    if body.get("base64Encoded"):
+        return base64.b64decode(body["body"])
+    return body["body"].encode("latin-1")
+
+
+def _usable(wanted, loaded_url, content):
+    # The page may have loaded another size of the same CDN image than the one we asked for
+    if loaded_url == wanted:
+        return True
+    size = imageformat.probe_size(content)
+    return bool(config.IMAGE_WIDTH and size and size[0] >= config.IMAGE_WIDTH)
+
+
+@contextlib.contextmanager
+def product(product_url):
+    """Bodies harvested in this thread inside the block belong to ``product_url``."""
+    previous = getattr(_local, "product", None)
+    _local.product = product_url
+    try:
+        yield
+    finally:
+        _local.product = previous
+
+
+def release(product_url):
+    """Drop ``product_url``'s bodies nothing took: filtered out, duplicates, or a job that failed or never ran."""
+    global _captured_bytes
+    with _lock:
+        for url in [url for url, (owner, _) in _captured.items() if owner == product_url]:
+            _captured_bytes -= len(_captured.pop(url)[1].content)
+
+
+def harvest(driver, urls):
+    """Keep the bodies of those ``urls`` the page in ``driver`` loaded; returns how many."""
+    global _captured_bytes
+    if not config.CAPTURE or getattr(driver, "static", False):
+        return 0
+    try:
+        loaded = _loaded_images(driver)
+    except Exception as e:
+        print(f"    ⚠️ Could not read the browser's network log ({e!r})")
+        return 0
+    by_image = {resolver.sized_url(url, 0): url for url in loaded}
+    owner = getattr(_local, "product", None)
+    budget = config.CAPTURE_MAX_MB * 1024 * 1024
+    count = over_budget = 0
+    for url in urls:
+        loaded_url = url if url in loaded else by_image.get(resolver.sized_url(url, 0))
+        if loaded_url is None:
+            continue
+        request_id, headers = loaded[loaded_url]
+        try:
+            content = _body(driver, request_id)
+        except Exception:
+            continue  # evicted from Chrome's buffer, download it instead
+        if not _usable(url, loaded_url, content):
+            continue
+        with _lock:
+            if _captured_bytes + len(content) > budget:
+                over_budget += 1
+                continue
+            previous = _captured.get(url)
+            if previous is not None:
+                _captured_bytes -= len(previous[1].content)
+            _captured[url] = (owner, Captured(content, CaseInsensitiveDict(headers)))
+            _captured_bytes += len(content)
+        count += 1
+    if count:
+        print(f"    ↳ {count}/{len(urls)} images taken from the browser")
+    if over_budget:
+        print(f"    ↳ {over_budget} more over the {config.CAPTURE_MAX_MB} MB capture budget, downloading them")
+    return count
+
+
+def take(url):
+    """Captured bytes for ``url`` (removed from the capture), or None."""
+    global _captured_bytes
+    with _lock:
+        taken = _captured.pop(url, None)
+        if taken is None:
+            return None
+        _captured_bytes -= len(taken[1].content)
+        return taken[1]
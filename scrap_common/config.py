@@ -0,0 +1,115 @@
+"""Runtime knobs for the shared scraping helpers.
+
+Every setting can be overridden through an environment variable so the
+interactive scripts keep their prompts unchanged, e.g.::
+
+    SCRAP_DOWNLOAD_WORKERS=16 python PortLyons/PorterLyons_image_scrap.py
+"""
+import os
+
+
+def _int_env(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+# Threads used to fetch the images of one product
+DOWNLOAD_WORKERS = _int_env("SCRAP_DOWNLOAD_WORKERS", 8)
+# Keep-alive connections kept open per host by the shared session
+POOL_SIZE = _int_env("SCRAP_POOL_SIZE", 16)
+# Max simultaneous requests to a single host, whatever the worker count
+PER_HOST_LIMIT = _int_env("SCRAP_PER_HOST_LIMIT", 6)
+# "threads" (requests + thread pool) or "async" (httpx, HTTP/2 multiplexing)
+DOWNLOAD_ENGINE = os.environ.get("SCRAP_DOWNLOAD_ENGINE", "threads").strip().lower()
+# Max image requests in flight at once with the async engine
+ASYNC_CONCURRENCY = _int_env("SCRAP_ASYNC_CONCURRENCY", 64)
+# Speak HTTP/2 without TLS/ALPN (h2c) - only useful against a local test server
+HTTP2_PRIOR_KNOWLEDGE = os.environ.get("SCRAP_HTTP2_PRIOR_KNOWLEDGE", "") == "1"
+# Chrome instances working through the product list in parallel
+BROWSER_WORKERS = _int_env("SCRAP_BROWSER_WORKERS", 4)
+# Threads running finished products' downloads while browsers move on
+DOWNLOAD_STAGE_WORKERS = _int_env("SCRAP_DOWNLOAD_STAGE_WORKERS", 2)
+# Times a worker relaunches a dead browser before giving up
+DRIVER_RESTARTS = _int_env("SCRAP_DRIVER_RESTARTS", 3)
+# Hard upper bound (s) for a product page to show its gallery
+READY_TIMEOUT = float(os.environ.get("SCRAP_READY_TIMEOUT", 10))
+# The network counts as idle once no new resource loaded for this long (s)
+NETWORK_IDLE_WINDOW = float(os.environ.get("SCRAP_NETWORK_IDLE_WINDOW", 0.5))
+# Longest we wait for network idle after the gallery is ready (s)
+NETWORK_IDLE_TIMEOUT = float(os.environ.get("SCRAP_NETWORK_IDLE_TIMEOUT", 3))
+# Try plain HTTP + lxml first and only use Chrome when that finds no images
+STATIC_FIRST = os.environ.get("SCRAP_STATIC_FIRST", "") == "1"
+# Use Shopify's products.json / <handle>.js endpoints before the browser
+SHOPIFY_API = os.environ.get("SCRAP_SHOPIFY_API", "1") != "0"
+# products.json pages fetched at once when listing a collection
+SHOPIFY_PAGE_CONCURRENCY = _int_env("SCRAP_SHOPIFY_PAGE_CONCURRENCY", 4)
+# Collection pages fetched at once when crawling a paginated listing's HTML
+COLLECTION_PAGE_CONCURRENCY = _int_env("SCRAP_COLLECTION_PAGE_CONCURRENCY", 4)
+# Content-addressed image store shared by all products and runs ("" disables it)
+STORE_DIR = os.environ.get("SCRAP_STORE_DIR", os.path.join(os.path.expanduser("~"), ".product_scrap", "store"))
+# How numbered files point into the store: "hardlink" (no extra disk) or "copy"
+STORE_LINK = os.environ.get("SCRAP_STORE_LINK", "hardlink").strip().lower()
+# Size cap of the image store/HTTP cache in MB; least recently used URLs go first
+CACHE_MAX_MB = _int_env("SCRAP_CACHE_MAX_MB", 4096)
+# Freshness (s) assumed for images whose response set no Cache-Control/Expires
+CACHE_DEFAULT_TTL = _int_env("SCRAP_CACHE_DEFAULT_TTL", 0)
+# SQLite journal of product/image progress used to resume interrupted runs
+JOURNAL_PATH = os.environ.get("SCRAP_JOURNAL", os.path.join(os.path.expanduser("~"), ".product_scrap", "journal.sqlite"))
+# Processes converting non-JPEG images (WebP/PNG/AVIF...) to JPEG; 0 converts in-thread
+TRANSCODE_PROCESSES = _int_env("SCRAP_TRANSCODE_PROCESSES", min(4, os.cpu_count() or 1))
+# Largest image body accepted; bigger downloads are aborted
+MAX_IMAGE_MB = _int_env("SCRAP_MAX_IMAGE_MB", 50)
+# Image width (px) requested from srcset/CDN-resizable URLs; 0 asks for the original
+IMAGE_WIDTH = _int_env("SCRAP_IMAGE_WIDTH", 2048)
+# Run Chrome without a window; SCRAP_HEADLESS=0 shows it for debugging
+HEADLESS = os.environ.get("SCRAP_HEADLESS", "1") != "0"
+# "eager" returns from driver.get once the DOM is parsed, "none" immediately, "normal" after every resource
+PAGE_LOAD_STRATEGY = os.environ.get("SCRAP_PAGE_LOAD_STRATEGY", "eager").strip().lower()
+# Request categories Chrome never fetches (see browser.BLOCK_PATTERNS); add "images" to skip image bodies
+BLOCK = [c.strip() for c in os.environ.get("SCRAP_BLOCK", "trackers,fonts,media").split(",") if c.strip()]
+# Take gallery image bytes from the browser's own network traffic when it already loaded them
+CAPTURE = os.environ.get("SCRAP_CAPTURE", "") == "1"
+# Captured bodies held at once (MB); images over the budget are downloaded as usual
+CAPTURE_MAX_MB = _int_env("SCRAP_CAPTURE_MAX_MB", 256)
+# chromedriver binary to use as is; by default it is resolved once and remembered in DRIVER_CACHE
+CHROMEDRIVER = os.environ.get("SCRAP_CHROMEDRIVER", "")
+DRIVER_CACHE = os.environ.get("SCRAP_DRIVER_CACHE", os.path.join(os.path.expanduser("~"), ".product_scrap", "chromedriver.path"))
+# Browsers kept launched in the background, ready to replace a dead or recycled one
+WARM_DRIVERS = _int_env("SCRAP_WARM_DRIVERS", 1)
+# A browser is replaced after this many pages, above this memory (MB, needs psutil)
+# or once this share of its last 10 pages failed; 0 disables each check
+RECYCLE_PAGES = _int_env("SCRAP_RECYCLE_PAGES", 200)
+RECYCLE_RSS_MB = _int_env("SCRAP_RECYCLE_RSS_MB", 1500)
+RECYCLE_ERROR_RATE = float(os.environ.get("SCRAP_RECYCLE_ERROR_RATE", 0.5))
+# Adaptive per-host request rate (req/s): pages start slow, image CDNs faster, both adjust by AIMD
+RATE_LIMIT = os.environ.get("SCRAP_RATE_LIMIT", "1") != "0"
+RATE_PAGE_START = float(os.environ.get("SCRAP_RATE_PAGE_START", 1))
+RATE_IMAGE_START = float(os.environ.get("SCRAP_RATE_IMAGE_START", 8))
+RATE_MIN = float(os.environ.get("SCRAP_RATE_MIN", 0.2))
+RATE_MAX = float(os.environ.get("SCRAP_RATE_MAX", 40))
+# Learned per-host rates, reused by the next run
+RATE_STATE = os.environ.get("SCRAP_RATE_STATE", os.path.join(os.path.expanduser("~"), ".product_scrap", "rates.json"))
+# Attempts per page load / image GET for transient errors, with jittered exponential backoff (s)
+RETRY_ATTEMPTS = _int_env("SCRAP_RETRY_ATTEMPTS", 3)
+RETRY_BACKOFF = float(os.environ.get("SCRAP_RETRY_BACKOFF", 1))
+RETRY_BACKOFF_MAX = float(os.environ.get("SCRAP_RETRY_BACKOFF_MAX", 30))
+# No new attempts once a product has been at it for this long (s)
+PRODUCT_DEADLINE = float(os.environ.get("SCRAP_PRODUCT_DEADLINE", 300))
+# A host failing this many times in a row is left alone for BREAKER_COOLDOWN s
+BREAKER_FAILURES = _int_env("SCRAP_BREAKER_FAILURES", 5)
+BREAKER_COOLDOWN = float(os.environ.get("SCRAP_BREAKER_COOLDOWN", 60))
+# Extra passes over the products that still failed at the end of a run
+RETRY_ROUNDS = _int_env("SCRAP_RETRY_ROUNDS", 1)
+# Streamed product URLs waiting for a browser; link discovery pauses while it is full
+PIPELINE_QUEUE = _int_env("SCRAP_PIPELINE_QUEUE", 100)
+# Product versions (sitemap lastmod) seen by each job's last run, for incremental runs
+SITEMAP_DIR = os.environ.get("SCRAP_SITEMAP_DIR", os.path.join(os.path.expanduser("~"), ".product_scrap", "sitemaps"))
+# Which selector of a cascade won on each host, tried first on the next product and run
+SELECTOR_CACHE = os.environ.get("SCRAP_SELECTOR_CACHE", os.path.join(os.path.expanduser("~"), ".product_scrap", "selectors.json"))
+# Misses in a row after which a learned selector is replaced by the full cascade's winner
+SELECTOR_MISSES = _int_env("SCRAP_SELECTOR_MISSES", 3)
+# Per-run timing trace (JSONL) and Prometheus text summary; SCRAP_METRICS=0 turns them off
+METRICS = os.environ.get("SCRAP_METRICS", "1") != "0"
+METRICS_DIR = os.environ.get("SCRAP_METRICS_DIR", os.path.join(os.path.expanduser("~"), ".product_scrap", "metrics"))
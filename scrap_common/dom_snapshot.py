@@ -0,0 +1,115 @@
+"""Read everything an extractor needs from the DOM in one round trip.
+
+Calling ``find_elements``/``get_attribute`` per node costs one WebDriver HTTP
+round trip each, which adds up to hundreds per gallery. ``snapshot`` instead
+runs a single ``execute_script`` that evaluates a batch of queries and returns
+plain JSON; selection and filtering then happen in Python.
+
+A query is a dict:
+
+``css``
+    selector of the elements to read (required)
+``scope``
+    optional selector; ``css`` is searched inside each match, in order, and
+    every record gets the ``scope`` index it was found in
+``scope_first``
+    only search inside the first ``scope`` match (like ``find_element``)
+``attrs``
+    attributes to read; ``src``/``href`` come back as absolute URLs, exactly
+    like ``WebElement.get_attribute``
+``text``
+    also return the element text
+``child``
+    a nested query whose first match inside the element is returned
+
+Each record looks like ``{"attrs": {...}, "text": ..., "scope": 0, "child": {...}}``.
+"""
+from selenium.webdriver.common.by import By
+
+from . import metrics
+
+_SNAPSHOT_JS = """
+const queries = arguments[0];
+const URL_PROPS = ['src', 'href'];
+function read(el, q, scopeIndex) {
+    const rec = {attrs: {}};
+    for (const name of (q.attrs || [])) {
+        let value = el.getAttribute(name);
+        if (value !== null && URL_PROPS.includes(name) && typeof el[name] === 'string') value = el[name];
+        rec.attrs[name] = value;
+    }
+    if (q.text) rec.text = (el.innerText || '').trim();
+    if (scopeIndex !== null) rec.scope = scopeIndex;
+    if (q.child) {
+        const c = el.querySelector(q.child.css);
+        rec.child = c ? read(c, q.child, null) : null;
+    }
+    return rec;
+}
+const out = {};
+for (const [key, q] of Object.entries(queries)) {
+    let scopes = [document];
+    if (q.scope) {
+        scopes = Array.from(document.querySelectorAll(q.scope));
+        if (q.scope_first) scopes = scopes.slice(0, 1);
+    }
+    const records = [];
+    scopes.forEach((scope, i) => {
+        for (const el of scope.querySelectorAll(q.css)) records.push(read(el, q, q.scope ? i : null));
+    });
+    out[key] = records;
+}
+return out;
+"""
+
+
+def _read(element, query, scope_index=None):
+    record = {"attrs": {name: element.get_attribute(name) for name in query.get("attrs", [])}}
+    if query.get("text"):
+        record["text"] = element.text.strip()
+    if scope_index is not None:
+        record["scope"] = scope_index
+    child_query = query.get("child")
+    if child_query:
+        children = element.find_elements(By.CSS_SELECTOR, child_query["css"])
+        record["child"] = _read(children[0], child_query) if children else None
+    return record
+
+
+def _snapshot_elements(driver, queries):
+    """Same result as the injected script, built through the WebElement API."""
+    out = {}
+    for key, query in queries.items():
+        if query.get("scope"):
+            scopes = driver.find_elements(By.CSS_SELECTOR, query["scope"])
+            if query.get("scope_first"):
+                scopes = scopes[:1]
+            out[key] = [
+                _read(el, query, i)
+                for i, scope in enumerate(scopes)
+                for el in scope.find_elements(By.CSS_SELECTOR, query["css"])
+            ]
+        else:
+            out[key] = [_read(el, query) for el in driver.find_elements(By.CSS_SELECTOR, query["css"])]
+    return out
+
+
+def snapshot(driver, queries):
+    """Evaluate ``queries`` against the current page; returns ``{key: [records]}``."""
+    if getattr(driver, "static", False) or not hasattr(driver, "execute_script"):
+        with metrics.span("dom_extract", driver="static"):
+            return _snapshot_elements(driver, queries)
+    with metrics.span("dom_extract", driver="browser"):
+        return driver.execute_script(_SNAPSHOT_JS, queries)
+
+
+def attr_values(records, *names):
+    """The first non-empty of ``names`` for each record, skipping records without any."""
+    values = []
+    for record in records:
+        for name in names:
+            value = (record or {}).get("attrs", {}).get(name)
+            if value:
+                values.append(value)
+                break
+    return values
@@ -0,0 +1,412 @@
+"""Concurrent image downloader shared by all site scrapers.
+
+Images are fetched on a thread pool through one keep-alive ``requests.Session``
+so every image of a gallery reuses the same CDN connections. Downloads finish
+out of order, but files are always numbered ``1.jpg..N.jpg`` in gallery order.
+Bodies are streamed to disk; images under the minimum size are dropped as soon
+as their header has arrived. JPEGs are saved byte for byte; other formats are
+converted on a process pool.
+URLs already in the image store (see ``image_store``) are linked from there
+without being re-encoded, and only revalidated once their cached copy is stale
+(see ``http_cache``).
+Temp files carry a per-download token and ``folder_lock`` serialises the jobs
+of products that end up in the same folder, so concurrent product downloads
+never touch each other's files.
+"""
+import contextlib
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import requests
+from PIL import Image
+from requests.adapters import HTTPAdapter
+
+from . import capture, config, http_cache, imageformat, journal, metrics, ratelimit, retry
+from .image_store import get_store
+
+HEADERS = {"User-Agent": "Mozilla/5.0"}
+CHUNK_SIZE = 64 * 1024
+# The first read is small, so the pixel-size probe does not wait for a whole chunk of a slow body
+FIRST_CHUNK_SIZE = 4 * 1024
+# Bytes read while looking for the pixel size before the body is written out
+PROBE_BYTES = 256 * 1024
+
+_session = None
+_session_lock = threading.Lock()
+_host_slots = {}
+_host_slots_lock = threading.Lock()
+_folder_locks = {}
+_folder_locks_lock = threading.Lock()
+
+
+def get_session():
+    """Return the process-wide pooled session, creating it on first use."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=config.POOL_SIZE, pool_maxsize=config.POOL_SIZE)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers.update(HEADERS)
+            _session = session
+        return _session
+
+
+def host_slot(url):
+    """Semaphore capping concurrent requests to the host of ``url``."""
+    host = urlparse(url).netloc
+    with _host_slots_lock:
+        slot = _host_slots.get(host)
+        if slot is None:
+            slot = _host_slots[host] = threading.BoundedSemaphore(config.PER_HOST_LIMIT)
+        return slot
+
+
+@contextlib.contextmanager
+def folder_lock(*folder_paths):
+    """Hold the (reentrant) locks of ``folder_paths`` so one job at a time writes into each folder."""
+    with _folder_locks_lock:
+        locks = [_folder_locks.setdefault(path, threading.RLock())
+                 for path in sorted({os.path.abspath(p) for p in folder_paths})]
+    with contextlib.ExitStack() as stack:
+        for lock in locks:  # always in sorted order, so two jobs cannot deadlock
+            stack.enter_context(lock)
+        yield
+
+
+def _temp_name(idx):
+    return f".{idx}-{uuid.uuid4().hex}"
+
+
+def rate_limited_get(url, page=False, paced=False, **kwargs):
+    """GET ``url`` on the pooled session once its host's rate allows it (see ``ratelimit``).
+
+    ``paced`` means the caller already waited in ``ratelimit.acquire``.
+    """
+    if not paced:
+        ratelimit.acquire(url, page)
+    sent = time.monotonic()
+    try:
+        r = get_session().get(url, **kwargs)
+    except requests.RequestException:
+        ratelimit.feedback(url, failed=True, page=page)
+        raise
+    ratelimit.feedback(url, r.status_code, time.monotonic() - sent, r.headers.get("Retry-After"), page=page)
+    return r
+
+
+class ImageSink:
+    """Receives an image body chunk by chunk and writes it to ``.{idx}-<token>.part``.
+
+    Leading chunks are held back until the header gives the pixel size, so an
+    image under ``min_size`` is abandoned without downloading the rest. The body
+    goes to a ``.download`` file first and is only renamed (or, if it is not a
+    plain JPEG, converted) to ``.part`` once it is complete.
+    """
+
+    def __init__(self, idx, folder_path, min_size=0, content_length=None):
+        self.min_size = min_size
+        self.limit = config.MAX_IMAGE_MB * 1024 * 1024
+        if content_length and int(content_length) > self.limit:
+            raise ValueError(f"image is {int(content_length)} bytes, over the {config.MAX_IMAGE_MB} MB limit")
+        name = _temp_name(idx)
+        self.download_path = os.path.join(folder_path, f"{name}.download")
+        self.part_path = os.path.join(folder_path, f"{name}.part")
+        self.head = b""
+        self.size = None
+        self.file = None
+        self.received = 0
+        self.write_seconds = 0.0
+
+    def feed(self, chunk):
+        """Take the next chunk; returns False once the rest of the body is not needed."""
+        self.received += len(chunk)
+        if self.received > self.limit:
+            self.discard()
+            raise ValueError(f"image is over the {config.MAX_IMAGE_MB} MB limit")
+        if self.file is not None:
+            self._write(chunk)
+            return True
+        self.head += chunk
+        self.size = imageformat.probe_size(self.head)
+        if self.size is None and len(self.head) < PROBE_BYTES:
+            return True
+        if self.size is not None and _too_small(self.size, self.min_size):
+            return False
+        self.file = open(self.download_path, "wb")
+        self._write(self.head)
+        return True
+
+    def _write(self, data):
+        started = time.monotonic()
+        self.file.write(data)
+        self.write_seconds += time.monotonic() - started
+
+    def finish(self):
+        """``(tmp_path, size)`` of the complete image, or ``(None, size)`` if it is too small."""
+        if self.size is not None and _too_small(self.size, self.min_size):
+            self.discard()
+            return None, self.size
+        if not self.received:
+            raise ValueError("empty response body")
+        if self.file is None:
+            self.file = open(self.download_path, "wb")
+            self._write(self.head)
+        self.file.close()
+        metrics.observe("disk_write", self.write_seconds, fields={"bytes": self.received})
+        try:
+            size = imageformat.passthrough_size(self.head)
+            if size is not None:
+                os.replace(self.download_path, self.part_path)
+                return self.part_path, size
+            with Image.open(self.download_path) as img:  # reads the header only
+                size = img.size
+            if _too_small(size, self.min_size):
+                return None, size
+            converted = self.download_path + ".jpg"
+            with metrics.span("transcode", format=imageformat.sniff_format(self.head) or "unknown"):
+                imageformat.transcode(self.download_path, converted)
+            os.replace(converted, self.part_path)
+            return self.part_path, size
+        finally:
+            self.discard()
+
+    def discard(self):
+        if self.file is not None:
+            self.file.close()
+        for path in (self.download_path, self.download_path + ".jpg"):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def _too_small(size, min_size):
+    return size[0] < min_size or size[1] < min_size
+
+
+def _from_store(idx, entry, folder_path, min_size):
+    """``ImageSink.finish``'s result rebuilt from a store entry, or None if it must be downloaded."""
+    if _too_small(entry.size, min_size):
+        return None, entry.size
+    if entry.blob is None:
+        return None  # skipped earlier with a lower min_size
+    tmp_path = os.path.join(folder_path, f"{_temp_name(idx)}.part")
+    if not get_store().restore(entry, tmp_path):
+        return None
+    metrics.count("images_from", source="store")
+    return tmp_path, entry.size
+
+
+def plan_download(idx, url, folder_path, min_size=0):
+    """Decide how to get ``url``: returns ``(result, entry, request_headers)``.
+
+    ``result`` is set when the browser already downloaded the image (see
+    ``capture``) or the store holds a fresh copy and no request is needed;
+    otherwise ``request_headers`` makes the GET conditional whenever the
+    stored copy could be reused after a 304.
+    """
+    captured = capture.take(url)
+    if captured is not None:
+        return save_captured(idx, url, captured, folder_path, min_size), None, {}
+    store = get_store()
+    entry = store.lookup(url) if store is not None else None
+    if entry is None:
+        return None, None, {}
+    if http_cache.is_fresh(entry):
+        result = _from_store(idx, entry, folder_path, min_size)
+        if result is not None:
+            return result, entry, {}
+    reusable = entry.blob is not None or _too_small(entry.size, min_size)
+    return None, entry, http_cache.conditional_headers(entry) if reusable else {}
+
+
+def save_captured(idx, url, captured, folder_path, min_size=0):
+    """Save bytes the browser already downloaded like a 200 response."""
+    metrics.count("images_from", source="browser")
+    sink = ImageSink(idx, folder_path, min_size, len(captured.content))
+    sink.feed(captured.content)
+    return keep_download(url, captured, sink.finish())
+
+
+def revalidated(idx, url, response, entry, folder_path, min_size=0):
+    """Reuse the stored copy after a 304; None if it has to be requested again unconditionally."""
+    get_store().touch(url, http_cache.validators(response, entry))
+    return _from_store(idx, entry, folder_path, min_size)
+
+
+def keep_download(url, response, result):
+    """Record a finished 200 download in the image store; returns ``result``."""
+    store = get_store()
+    if store is not None:
+        tmp_path, size = result
+        meta = http_cache.validators(response)
+        if tmp_path is None:
+            store.put_skipped(url, size, meta)
+        else:
+            store.put(url, tmp_path, size, meta)
+    return result
+
+
+def iter_chunks(response):
+    """``response``'s body in one ``FIRST_CHUNK_SIZE`` chunk, then ``CHUNK_SIZE`` ones."""
+    first = next(response.iter_content(FIRST_CHUNK_SIZE), b"")
+    if first:
+        yield first
+        yield from response.iter_content(CHUNK_SIZE)
+
+
+def download_image(idx, url, entry, headers, folder_path, min_size=0, timeout=60):
+    """Stream ``url`` into ``folder_path``; returns ``ImageSink.finish``'s result (None as in ``revalidated``)."""
+    ratelimit.acquire(url)  # outside the span, which times the request itself
+    with metrics.span("image_get", url=url, host=urlparse(url).netloc) as fields:
+        with host_slot(url), rate_limited_get(url, paced=True, timeout=timeout, headers=headers, stream=True) as r:
+            fields.update(status=r.status_code, ttfb=round(r.elapsed.total_seconds(), 4))
+            if r.status_code == 304 and entry is not None:
+                return revalidated(idx, url, r, entry, folder_path, min_size)
+            r.raise_for_status()
+            sink = ImageSink(idx, folder_path, min_size, r.headers.get("Content-Length"))
+            try:
+                for chunk in iter_chunks(r):
+                    if not sink.feed(chunk):
+                        break
+            except BaseException:
+                sink.discard()
+                raise
+            finally:
+                fields["bytes"] = sink.received
+                metrics.count("image_bytes", sink.received)
+    return keep_download(url, r, sink.finish())
+
+
+def record_result(record, idx, url, started, result=None, error=None):
+    """Report one image's outcome to the job journal (``record`` may be None)."""
+    if record is None:
+        return
+    seconds = time.monotonic() - started
+    if error is not None:
+        record(idx, url, journal.FAILED, seconds, repr(error))
+    else:
+        record(idx, url, journal.DOWNLOADED if result[0] else journal.SKIPPED, seconds)
+
+
+def _fetch_and_save(idx, url, folder_path, min_size, timeout, record=None, deadline=None):
+    started = time.monotonic()
+
+    def fetch():
+        result = download_image(idx, url, entry, headers, folder_path, min_size, timeout)
+        if result is None:
+            result = download_image(idx, url, None, {}, folder_path, min_size, timeout)
+        return result
+
+    try:
+        result, entry, headers = plan_download(idx, url, folder_path, min_size)
+        if result is None:
+            result = retry.call(fetch, url, deadline)
+    except Exception as e:
+        record_result(record, idx, url, started, error=e)
+        raise
+    record_result(record, idx, url, started, result)
+    return result
+
+
+def record_pending(record, image_urls):
+    if record is not None:
+        for idx, url in enumerate(image_urls, 1):
+            record(idx, url, journal.PENDING)
+
+
+def number_results(image_urls, outcomes, folder_path, compact=False):
+    """Rename finished temp files to ``<n>.jpg`` in gallery order.
+
+    ``outcomes`` yields, in the same order as ``image_urls``, a callable that
+    returns the result of ``ImageSink.finish`` or raises the download error.
+    """
+    saved = []
+    count = 1
+    for idx, (url, outcome) in enumerate(zip(image_urls, outcomes), 1):
+        try:
+            tmp_path, info = outcome()
+        except Exception as e:
+            print(f"    ✘ Failed to download {url} - {e!r}")
+            metrics.count("images", result="failed")
+            continue
+        if tmp_path is None:
+            print(f"    - Skipped {url} (too small {info})")
+            metrics.count("images", result="skipped")
+            continue
+        number = count if compact else idx
+        save_path = os.path.join(folder_path, f"{number}.jpg")
+        if os.path.exists(save_path) and os.path.samefile(tmp_path, save_path):
+            os.remove(tmp_path)  # already linked to the same blob; os.replace would leave both names
+        else:
+            os.replace(tmp_path, save_path)
+        saved.append(save_path)
+        count += 1
+        print(f"    ✔ Saved {os.path.abspath(save_path)} [{info}]")
+        metrics.count("images", result="saved")
+    return saved
+
+
+def evict_cache():
+    store = get_store()
+    if store is not None:
+        store.evict()
+
+
+def _use_async_engine():
+    if config.DOWNLOAD_ENGINE != "async":
+        return False
+    try:
+        import httpx  # noqa: F401
+    except ImportError:
+        print("  ⚠️ SCRAP_DOWNLOAD_ENGINE=async needs httpx, using the thread pool instead.")
+        return False
+    return True
+
+
+def download_groups(groups, min_size=0, compact=False, timeout=60):
+    """Download several ``(image_urls, folder_path)`` groups, e.g. gallery and 360 spin.
+
+    Returns one list of saved paths per group.
+    """
+    with folder_lock(*(folder_path for _, folder_path in groups)):
+        if _use_async_engine():
+            from . import async_downloader
+            return async_downloader.download_groups(groups, min_size, compact, timeout)
+        return _download_groups_threads(groups, min_size, compact, timeout)
+
+
+def _download_groups_threads(groups, min_size, compact, timeout):
+    record = journal.image_recorder()
+    deadline = time.monotonic() + config.PRODUCT_DEADLINE
+    with ThreadPoolExecutor(max_workers=max(1, config.DOWNLOAD_WORKERS)) as pool:
+        submitted = []
+        for image_urls, folder_path in groups:
+            os.makedirs(folder_path, exist_ok=True)
+            record_pending(record, image_urls)
+            submitted.append([
+                pool.submit(_fetch_and_save, idx, url, folder_path, min_size, timeout, record, deadline)
+                for idx, url in enumerate(image_urls, 1)
+            ])
+        # Futures are consumed in submission order, which keeps numbering stable
+        results = [
+            number_results(image_urls, (f.result for f in futures), folder_path, compact)
+            for (image_urls, folder_path), futures in zip(groups, submitted)
+        ]
+    evict_cache()
+    return results
+
+
+def download_numbered(image_urls, folder_path, min_size=0, compact=False, timeout=60):
+    """Download ``image_urls`` concurrently into ``folder_path`` as numbered JPEGs.
+
+    By default each image keeps its gallery position as file name, so a failed
+    download leaves a gap. With ``compact=True`` only saved images are counted
+    (images smaller than ``min_size`` px are skipped without using a number).
+    Returns the list of saved paths in gallery order.
+    """
+    return download_groups([(image_urls, folder_path)], min_size, compact, timeout)[0]
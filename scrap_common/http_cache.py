@@ -0,0 +1,75 @@
+"""HTTP caching rules for image downloads.
+
+The image store keeps, per URL, the response's ``ETag``/``Last-Modified`` and
+the time until which the response is fresh (``Cache-Control: max-age`` or
+``Expires``). A fresh entry is reused without any request; a stale one is
+revalidated with ``If-None-Match``/``If-Modified-Since`` so a ``304 Not
+Modified`` keeps the stored file and only changed images are downloaded again.
+"""
+import re
+import time
+from email.utils import parsedate_to_datetime
+
+from . import config
+
+_MAX_AGE = re.compile(r"(?:^|,)\s*(?:s-maxage|max-age)\s*=\s*(\d+)", re.I)
+
+
+def _http_date(value):
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def fresh_until(headers, now=None):
+    """Epoch seconds until which a response with ``headers`` may be reused."""
+    now = time.time() if now is None else now
+    cache_control = headers.get("Cache-Control", "")
+    if re.search(r"no-store|no-cache", cache_control, re.I):
+        return now
+    match = _MAX_AGE.search(cache_control)
+    if match:
+        age = str(headers.get("Age", ""))
+        age = int(age) if age.isdigit() else 0
+        return now + int(match.group(1)) - age
+    expires = _http_date(headers.get("Expires"))
+    if expires is not None:
+        return expires
+    return now + config.CACHE_DEFAULT_TTL
+
+
+def validators(response, previous=None):
+    """Cache metadata to store for ``response`` (a 200 or a 304 revalidating ``previous``)."""
+    headers = response.headers
+    etag = headers.get("ETag") or (previous.etag if previous else None)
+    last_modified = headers.get("Last-Modified") or (previous.last_modified if previous else None)
+    return {"etag": etag, "last_modified": last_modified, "expires_at": fresh_until(headers)}
+
+
+def retry_after(value, now=None):
+    """Seconds to wait from a ``Retry-After`` header (delta or HTTP date), or None."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    when = _http_date(value)
+    if when is None:
+        return None
+    return max(0.0, when - (time.time() if now is None else now))
+
+
+def is_fresh(entry, now=None):
+    return entry.expires_at is not None and entry.expires_at > (time.time() if now is None else now)
+
+
+def conditional_headers(entry):
+    headers = {}
+    if entry is None:
+        return headers
+    if entry.etag:
+        headers["If-None-Match"] = entry.etag
+    if entry.last_modified:
+        headers["If-Modified-Since"] = entry.last_modified
+    return headers
@@ -0,0 +1,216 @@
+"""Content-addressed store for downloaded images, doubling as the HTTP cache.
+
+Every saved JPEG is kept once under ``<STORE_DIR>/blobs/<aa>/<sha256>.jpg`` and
+the numbered per-product files are hardlinks (or copies, see
+``SCRAP_STORE_LINK``) to those blobs, so an image shared by many products uses
+disk space once. A SQLite index maps each image URL to its blob, pixel size
+and HTTP validators (see ``http_cache``), which lets a re-run skip the
+download and the re-encode of any URL it has already fetched. URLs of images
+too small to keep are indexed without a blob.
+
+The index runs in WAL mode and blobs are written to a temp name then renamed,
+so several scraper processes can share one store. ``evict`` keeps the store
+under ``SCRAP_CACHE_MAX_MB`` by dropping least recently used URLs.
+
+Note: with hardlinks, editing a numbered file in place edits the stored blob
+for every product sharing it; use ``SCRAP_STORE_LINK=copy`` if output folders
+are edited directly. Blobs changed on disk are detected and not reused.
+"""
+import hashlib
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from collections import namedtuple
+
+from . import config
+
+Entry = namedtuple("Entry", "url blob size etag last_modified expires_at")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS urls (
+    url TEXT PRIMARY KEY, digest TEXT, width INTEGER, height INTEGER, fetched_at REAL,
+    etag TEXT, last_modified TEXT, expires_at REAL, last_used REAL
+);
+CREATE TABLE IF NOT EXISTS blobs (digest TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER);
+CREATE INDEX IF NOT EXISTS urls_last_used ON urls (last_used);
+"""
+# Columns added after the first version of the index
+_URL_COLUMNS = {"etag": "TEXT", "last_modified": "TEXT", "expires_at": "REAL", "last_used": "REAL"}
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def _link_or_copy(src, dst):
+    if config.STORE_LINK == "hardlink":
+        try:
+            os.link(src, dst)
+            return
+        except FileNotFoundError:
+            raise
+        except OSError:
+            pass  # other filesystem, or no hardlink support
+    shutil.copyfile(src, dst)
+
+
+def _add_blob(path, blob):
+    """Put the file at ``path`` in the store as ``blob``, leaving ``path`` in place."""
+    os.makedirs(os.path.dirname(blob), exist_ok=True)
+    tmp_blob = f"{blob}.{uuid.uuid4().hex}.part"
+    _link_or_copy(path, tmp_blob)
+    os.replace(tmp_blob, blob)
+
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ImageStore:
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(os.path.join(root, "blobs"), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(root, "index.sqlite"), timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(urls)")}
+        if columns:
+            for name, kind in _URL_COLUMNS.items():
+                if name not in columns:
+                    self._db.execute(f"ALTER TABLE urls ADD COLUMN {name} {kind}")
+        self._db.executescript(_SCHEMA)
+        self._db.commit()
+
+    def blob_path(self, digest):
+        return os.path.join(self.root, "blobs", digest[:2], digest + ".jpg")
+
+    def lookup(self, url):
+        """The ``Entry`` for a known URL (``blob`` is None for skipped images), else None."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT u.digest, u.width, u.height, u.etag, u.last_modified, u.expires_at, b.size, b.mtime_ns"
+                " FROM urls u LEFT JOIN blobs b ON b.digest = u.digest WHERE u.url = ?",
+                (url,),
+            ).fetchone()
+        if row is None:
+            return None
+        digest, width, height, etag, last_modified, expires_at, size, mtime_ns = row
+        blob = None
+        if digest is not None:
+            blob = self.blob_path(digest)
+            try:
+                st = os.stat(blob)
+            except OSError:
+                return None
+            if st.st_size != size or st.st_mtime_ns != mtime_ns:
+                return None  # blob was edited or replaced since it was stored
+        return Entry(url, blob, (width, height), etag, last_modified, expires_at)
+
+    def restore(self, entry, dest_path):
+        """Link the blob of ``entry`` to ``dest_path``; False if it vanished meanwhile."""
+        try:
+            _link_or_copy(entry.blob, dest_path)
+        except FileNotFoundError:
+            return False  # evicted by another process
+        self.touch(entry.url)
+        return True
+
+    def put(self, url, path, size, meta=None):
+        """Move the image at ``path`` into the store and leave a link to the blob in its place.
+
+        Returns the blob's digest, or None if the blob was evicted before it could be recorded.
+        """
+        digest = file_digest(path)
+        blob = self.blob_path(digest)
+        if not os.path.exists(blob):
+            _add_blob(path, blob)
+        else:
+            # Linked under a temp name, so the download is still at ``path`` if another process evicts the blob now
+            tmp_path = f"{path}.{uuid.uuid4().hex}.link"
+            try:
+                _link_or_copy(blob, tmp_path)
+            except FileNotFoundError:
+                _add_blob(path, blob)
+            else:
+                os.replace(tmp_path, path)
+        try:
+            st = os.stat(blob)
+        except FileNotFoundError:
+            return None  # evicted again straight away: keep the download, just not in the store
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO blobs VALUES (?, ?, ?)", (digest, st.st_size, st.st_mtime_ns))
+            self._remember(url, digest, size, meta)
+        return digest
+
+    def put_skipped(self, url, size, meta=None):
+        """Remember that ``url`` is an image we don't keep (e.g. too small)."""
+        with self._lock:
+            self._remember(url, None, size, meta)
+
+    def _remember(self, url, digest, size, meta):
+        meta = meta or {}
+        now = time.time()
+        self._db.execute(
+            "INSERT OR REPLACE INTO urls VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (url, digest, size[0], size[1], now,
+             meta.get("etag"), meta.get("last_modified"), meta.get("expires_at"), now),
+        )
+        self._db.commit()
+
+    def touch(self, url, meta=None):
+        """Mark ``url`` as used now, refreshing its validators after a 304."""
+        with self._lock:
+            if meta is None:
+                self._db.execute("UPDATE urls SET last_used = ? WHERE url = ?", (time.time(), url))
+            else:
+                self._db.execute(
+                    "UPDATE urls SET last_used = ?, etag = ?, last_modified = ?, expires_at = ? WHERE url = ?",
+                    (time.time(), meta["etag"], meta["last_modified"], meta["expires_at"], url),
+                )
+            self._db.commit()
+
+    def evict(self, max_bytes=None):
+        """Drop least recently used URLs until the blobs fit in ``max_bytes``."""
+        max_bytes = config.CACHE_MAX_MB * 1024 * 1024 if max_bytes is None else max_bytes
+        removed = []
+        with self._lock:
+            total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+            if total <= max_bytes:
+                return 0
+            cursor = self._db.execute("SELECT url, digest FROM urls ORDER BY last_used")
+            for url, digest in cursor.fetchall():
+                if total <= max_bytes:
+                    break
+                self._db.execute("DELETE FROM urls WHERE url = ?", (url,))
+                if digest is None:
+                    continue
+                if self._db.execute("SELECT 1 FROM urls WHERE digest = ? LIMIT 1", (digest,)).fetchone():
+                    continue  # still used by another URL
+                size = self._db.execute("SELECT size FROM blobs WHERE digest = ?", (digest,)).fetchone()
+                self._db.execute("DELETE FROM blobs WHERE digest = ?", (digest,))
+                total -= size[0] if size else 0
+                removed.append(digest)
+            self._db.commit()
+        for digest in removed:
+            try:
+                os.remove(self.blob_path(digest))
+            except OSError:
+                pass
+        return len(removed)
+
+
+def get_store():
+    """The process-wide store, or None when ``SCRAP_STORE_DIR`` is empty."""
+    global _store
+    if not config.STORE_DIR:
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = ImageStore(config.STORE_DIR)
+        return _store
@@ -0,0 +1,140 @@
+"""Image format sniffing, header size probing and JPEG transcoding.
+
+Downloads that already are plain JPEGs are written byte for byte: no decode,
+no re-encode, no generation loss. Only other formats (WebP, PNG, AVIF, ...)
+or JPEGs we can't use as is (CMYK, lossless/arithmetic coded) are converted,
+on a process pool so encoding is not serialised behind the GIL.
+"""
+import atexit
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from PIL import Image
+
+from . import config
+
+# Baseline, extended sequential and progressive Huffman JPEG
+_PASSTHROUGH_SOF = {0xC0, 0xC1, 0xC2}
+# Every other start-of-frame marker (lossless, hierarchical, arithmetic coding)
+_OTHER_SOF = {0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def sniff_format(head):
+    """Format name from the leading magic bytes of a file, or None."""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    if head[4:8] == b"ftyp" and head[8:12] in (b"avif", b"avis"):
+        return "avif"
+    if head[4:8] == b"ftyp" and head[8:12] in (b"heic", b"heix", b"mif1"):
+        return "heif"
+    if head[:2] == b"BM":
+        return "bmp"
+    if head[:4] in (b"II*\x00", b"MM\x00*"):
+        return "tiff"
+    return None
+
+
+def jpeg_frame(data):
+    """``(marker, width, height, components)`` of a JPEG's start-of-frame, or None."""
+    if not data.startswith(b"\xff\xd8"):
+        return None
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        if marker == 0xFF:  # fill byte
+            pos += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:  # markers without a length
+            pos += 2
+            continue
+        length = int.from_bytes(data[pos + 2:pos + 4], "big")
+        if marker in _PASSTHROUGH_SOF or marker in _OTHER_SOF:
+            if pos + 10 > len(data):
+                return None
+            height = int.from_bytes(data[pos + 5:pos + 7], "big")
+            width = int.from_bytes(data[pos + 7:pos + 9], "big")
+            return marker, width, height, data[pos + 9]
+        if marker == 0xDA:  # start of scan before any frame header
+            return None
+        pos += 2 + length
+    return None
+
+
+def passthrough_size(data):
+    """Pixel size if ``data`` can be saved as is as a ``.jpg``, else None."""
+    frame = jpeg_frame(data)
+    if frame is None:
+        return None
+    marker, width, height, components = frame
+    # Grayscale or YCbCr only: CMYK/YCCK JPEGs get converted to RGB like before
+    if marker not in _PASSTHROUGH_SOF or components not in (1, 3) or not width or not height:
+        return None
+    return width, height
+
+
+def probe_size(head):
+    """Pixel size read from the leading bytes of an image, or None if not there (yet)."""
+    fmt = sniff_format(head)
+    if fmt == "jpeg":
+        frame = jpeg_frame(head)
+        return frame[1:3] if frame else None
+    if fmt == "png" and len(head) >= 24:
+        return int.from_bytes(head[16:20], "big"), int.from_bytes(head[20:24], "big")
+    if fmt == "gif" and len(head) >= 10:
+        return int.from_bytes(head[6:8], "little"), int.from_bytes(head[8:10], "little")
+    if fmt == "bmp" and len(head) >= 26:
+        return int.from_bytes(head[18:22], "little"), abs(int.from_bytes(head[22:26], "little", signed=True))
+    if fmt == "webp" and len(head) >= 30:
+        chunk = head[12:16]
+        if chunk == b"VP8X":
+            return int.from_bytes(head[24:27], "little") + 1, int.from_bytes(head[27:30], "little") + 1
+        if chunk == b"VP8 ":
+            return int.from_bytes(head[26:28], "little") & 0x3FFF, int.from_bytes(head[28:30], "little") & 0x3FFF
+        if chunk == b"VP8L":
+            bits = int.from_bytes(head[21:25], "little")
+            return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    return None
+
+
+def to_jpeg(src_path, dest_path):
+    """Decode any Pillow-readable image file and write it as an RGB JPEG."""
+    with Image.open(src_path) as img:
+        img.convert("RGB").save(dest_path, "JPEG")
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None and config.TRANSCODE_PROCESSES > 0:
+            # Forking from a download thread can inherit held locks; spawn starts clean
+            _pool = ProcessPoolExecutor(max_workers=config.TRANSCODE_PROCESSES,
+                                        mp_context=multiprocessing.get_context("spawn"))
+            atexit.register(_pool.shutdown)
+        return _pool
+
+
+def transcode(src_path, dest_path):
+    """``to_jpeg`` on the transcoding process pool (in-thread if it is disabled or broken)."""
+    global _pool
+    pool = _get_pool()
+    if pool is None:
+        return to_jpeg(src_path, dest_path)
+    try:
+        return pool.submit(to_jpeg, src_path, dest_path).result()
+    except BrokenProcessPool:
+        with _pool_lock:
+            _pool = None
+        return to_jpeg(src_path, dest_path)
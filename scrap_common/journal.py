@@ -0,0 +1,203 @@
+"""Persistent job journal so an interrupted crawl can resume where it stopped.
+
+Every scraper run is a job named after the script. The journal (SQLite in WAL
+mode, ``SCRAP_JOURNAL``) stores the job's output folder and, per product URL,
+its state (pending, page-done, downloaded, failed), attempt count and timings,
+plus one row per image URL with its own state, attempts and download time.
+After a crash, a dead Chrome or Ctrl+C, the next run offers to resume and only
+products that did not reach ``downloaded`` are processed again.
+
+Jobs whose products are discovered while they run (a streamed listing) also
+store where they came from and whether discovery reached the end; a resume
+of an unfinished discovery reads that source again (``unfinished_source``),
+skipping the products already downloaded (``downloaded_urls``).
+"""
+import os
+import sqlite3
+import threading
+import time
+
+from . import config
+
+PENDING = "pending"
+PAGE_DONE = "page-done"
+DOWNLOADED = "downloaded"
+SKIPPED = "skipped"
+FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    name TEXT PRIMARY KEY, root_folder TEXT, started_at REAL, source TEXT, discovery_done INTEGER DEFAULT 1
+);
+CREATE TABLE IF NOT EXISTS products (
+    job TEXT, url TEXT, position INTEGER, state TEXT, attempts INTEGER DEFAULT 0,
+    started_at REAL, page_seconds REAL, download_seconds REAL, error TEXT,
+    PRIMARY KEY (job, url)
+);
+CREATE TABLE IF NOT EXISTS images (
+    job TEXT, product_url TEXT, url TEXT, position INTEGER, state TEXT,
+    attempts INTEGER DEFAULT 0, seconds REAL, error TEXT,
+    PRIMARY KEY (job, product_url, url)
+);
+"""
+
+_local = threading.local()
+
+
+class Journal:
+    def __init__(self, name, path=None):
+        self.name = name
+        path = path or config.JOURNAL_PATH
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(jobs)")}
+        for column, kind in (("source", "TEXT"), ("discovery_done", "INTEGER DEFAULT 1")):
+            if column not in columns:  # journal written before discovery was tracked
+                self._db.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+        self._db.commit()
+
+    def _write(self, sql, params):
+        with self._lock:
+            self._db.execute(sql, params)
+            self._db.commit()
+
+    def unfinished(self):
+        """``(root_folder, product_urls)`` left over from the last run, or None."""
+        with self._lock:
+            job = self._db.execute("SELECT root_folder, discovery_done FROM jobs WHERE name = ?", (self.name,)).fetchone()
+            rows = self._db.execute(
+                "SELECT url FROM products WHERE job = ? AND state != ? ORDER BY position",
+                (self.name, DOWNLOADED),
+            ).fetchall()
+        if job is None or (not rows and job[1]):
+            return None
+        return job[0], [url for (url,) in rows]
+
+    def unfinished_source(self):
+        """Listing URL (or URL file) the last run was still discovering products from, or None."""
+        with self._lock:
+            job = self._db.execute("SELECT source, discovery_done FROM jobs WHERE name = ?", (self.name,)).fetchone()
+        if job is None or job[1]:
+            return None
+        return job[0]
+
+    def downloaded_urls(self):
+        with self._lock:
+            rows = self._db.execute("SELECT url FROM products WHERE job = ? AND state = ?",
+                                    (self.name, DOWNLOADED)).fetchall()
+        return {url for (url,) in rows}
+
+    def offer_resume(self):
+        """Ask whether to resume an unfinished run; returns ``unfinished()`` if yes."""
+        leftover = self.unfinished()
+        if leftover is None:
+            return None
+        rest = " and the rest of its listing" if self.unfinished_source() else ""
+        answer = input(f"Found {len(leftover[1])} unfinished products{rest} from the last run "
+                       f"(saving to '{leftover[0]}'). Resume them? (Y/n): ").strip().lower()
+        if answer in ("n", "no"):
+            return None
+        return leftover
+
+    def start(self, product_urls, root_folder, source=None):
+        """Start a new job, forgetting any previous run of it.
+
+        ``source`` is where streamed products are discovered from (listing
+        URL or URL file); discovery counts as unfinished until
+        ``discovery_finished``.
+        """
+        with self._lock:
+            self._db.execute("DELETE FROM products WHERE job = ?", (self.name,))
+            self._db.execute("DELETE FROM images WHERE job = ?", (self.name,))
+            self._db.execute(
+                "INSERT OR REPLACE INTO jobs (name, root_folder, started_at, source, discovery_done) VALUES (?, ?, ?, ?, ?)",
+                (self.name, root_folder, time.time(), source, int(source is None)),
+            )
+            self._db.executemany(
+                "INSERT OR IGNORE INTO products (job, url, position, state) VALUES (?, ?, ?, ?)",
+                [(self.name, url, position, PENDING) for position, url in enumerate(product_urls, 1)],
+            )
+            self._db.commit()
+
+    def discovery_finished(self):
+        """The streamed product source was read to the end."""
+        self._write("UPDATE jobs SET discovery_done = 1 WHERE name = ?", (self.name,))
+
+    def add_product(self, url, position):
+        """Add a product found while the job is already running (streamed URLs)."""
+        self._write(
+            "INSERT OR IGNORE INTO products (job, url, position, state) VALUES (?, ?, ?, ?)",
+            (self.name, url, position, PENDING),
+        )
+
+    def product_started(self, url):
+        self._write(
+            "UPDATE products SET attempts = attempts + 1, started_at = ?, error = NULL WHERE job = ? AND url = ?",
+            (time.time(), self.name, url),
+        )
+
+    def product_page_done(self, url, seconds):
+        self._write(
+            "UPDATE products SET state = ?, page_seconds = ? WHERE job = ? AND url = ?",
+            (PAGE_DONE, seconds, self.name, url),
+        )
+
+    def product_failed(self, url, error):
+        self._write(
+            "UPDATE products SET state = ?, error = ? WHERE job = ? AND url = ?",
+            (FAILED, str(error)[:500], self.name, url),
+        )
+
+    def product_downloaded(self, url, seconds):
+        """Close a product after its download job; failed (returns False) if any of its images failed."""
+        with self._lock:
+            failed = self._db.execute(
+                "SELECT COUNT(*) FROM images WHERE job = ? AND product_url = ? AND state = ?",
+                (self.name, url, FAILED),
+            ).fetchone()[0]
+            state, error = (FAILED, f"{failed} images failed") if failed else (DOWNLOADED, None)
+            self._db.execute(
+                "UPDATE products SET state = ?, download_seconds = ?, error = ? WHERE job = ? AND url = ?",
+                (state, seconds, error, self.name, url),
+            )
+            self._db.commit()
+        return not failed
+
+    def record_image(self, product_url, position, url, state, seconds=None, error=None):
+        attempt = 0 if state == PENDING else 1
+        self._write(
+            "INSERT INTO images (job, product_url, url, position, state, attempts, seconds, error)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT (job, product_url, url) DO UPDATE SET"
+            " position = excluded.position, state = excluded.state, attempts = attempts + excluded.attempts,"
+            " seconds = excluded.seconds, error = excluded.error",
+            (self.name, product_url, url, position, state, attempt, seconds, error and str(error)[:500]),
+        )
+
+
+class product_context:
+    """Attribute image downloads made in this thread to ``product_url`` of ``journal``."""
+
+    def __init__(self, journal, product_url):
+        self.value = (journal, product_url)
+
+    def __enter__(self):
+        self.previous = getattr(_local, "product", None)
+        _local.product = self.value
+        return self
+
+    def __exit__(self, *exc):
+        _local.product = self.previous
+
+
+def image_recorder():
+    """A ``record(position, url, state, seconds=None, error=None)`` callable for the
+    product being downloaded in this thread, or None outside a journaled job."""
+    current = getattr(_local, "product", None)
+    if current is None:
+        return None
+    journal, product_url = current
+    return lambda *args, **kwargs: journal.record_image(product_url, *args, **kwargs)
@@ -0,0 +1,218 @@
+"""Product links of collection/listing pages.
+
+``crawl_collection`` reads a paginated collection over plain HTTP: the
+pagination (``?page=N``, ``/page/N``, ``rel=next``, "load more" URLs) is
+detected on the first page, further pages are fetched
+``config.COLLECTION_PAGE_CONCURRENCY`` at a time and normalised product URLs
+are yielded as each page arrives.
+
+For pages that load more products as they are scrolled,
+``harvest_links`` installs a MutationObserver that records every matching
+``<a href>`` once, as it is added to the page. Each round jumps straight to
+the bottom, waits for the network to go idle and then takes only the links
+added since the previous round, so the cost per round no longer grows with the
+number of products already on the page. Harvesting stops once the page has
+stopped growing after its requests settled, rather than after a number of
+fixed-sleep scroll passes.
+"""
+import re
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlparse, urlunparse
+
+from selenium.webdriver.common.by import By
+
+from . import config, readiness, retry
+
+PRODUCT_LINK_CSS = "a[href*='/products/']"
+# Where themes put the next page's URL: <link rel=next>, pagination links, "load more" buttons
+_PAGE_LINK_CSS = "link[rel~='next'], a[rel~='next'], a[href*='page'], [data-url*='page'], [data-next-url*='page']"
+_PAGE_NUMBER = re.compile(r"([?&]page=|/page/)(\d+)")
+
+# Record each new matching href in window.__scrapLinks.fresh; safe to run twice
+_INSTALL_JS = """
+const css = arguments[0];
+if (!window.__scrapLinks) {
+    // The default buffer of 250 entries would freeze the idle check on long listings
+    performance.setResourceTimingBufferSize(100000);
+    const state = window.__scrapLinks = {seen: new Set(), fresh: []};
+    const add = (a) => {
+        const href = a.href;
+        if (href && href.startsWith('http') && !state.seen.has(href)) {
+            state.seen.add(href);
+            state.fresh.push(href);
+        }
+    };
+    const scan = (node) => {
+        if (node.nodeType !== 1) return;
+        if (node.matches(css)) add(node);
+        node.querySelectorAll(css).forEach(add);
+    };
+    scan(document.documentElement);
+    new MutationObserver((records) => {
+        for (const r of records) {
+            if (r.type === 'attributes') scan(r.target);
+            else r.addedNodes.forEach(scan);
+        }
+    }).observe(document.documentElement, {childList: true, subtree: true, attributes: true, attributeFilter: ['href']});
+}
+"""
+
+# Hand over the links added since the last call, with the page height; null if the observer is gone
+_TAKE_JS = """
+const state = window.__scrapLinks;
+if (!state) return null;
+const fresh = state.fresh;
+state.fresh = [];
+return [fresh, document.documentElement.scrollHeight];
+"""
+
+_TO_BOTTOM_JS = "window.scrollTo(0, document.documentElement.scrollHeight);"
+
+# Back up a screen and return, for sentinels that only fire when they re-enter the viewport
+_NUDGE_JS = """
+window.scrollBy(0, -window.innerHeight);
+window.scrollTo(0, document.documentElement.scrollHeight);
+"""
+
+
+def _take(driver, css):
+    """``(fresh links, page height)``, or None if the observer cannot be put back on the page."""
+    taken = driver.execute_script(_TAKE_JS)
+    if taken is None:  # the page reloaded or replaced its document
+        driver.execute_script(_INSTALL_JS, css)
+        taken = driver.execute_script(_TAKE_JS)
+    return taken
+
+
+def harvest_links(driver, css="a[href*='/products/']", settle_rounds=2):
+    """Yield the href of each ``css`` anchor once, as the listing grows; stops when it no longer grows.
+
+    The listing counts as finished after ``settle_rounds`` rounds in a row
+    in which, once the network was idle, no link was added and the page
+    height did not change.
+    """
+    driver.execute_script(_INSTALL_JS, css)
+    seen = set()  # a replaced document is scanned again from the top by the reinstalled observer
+    total, quiet, height = 0, 0, None
+    while quiet < settle_rounds:
+        driver.execute_script(_NUDGE_JS if quiet else _TO_BOTTOM_JS)
+        readiness.wait_network_idle(driver)
+        taken = _take(driver, css)
+        if taken is None:
+            print(f"  ⚠️ Lost the listing page, stopping after {total} links")
+            return
+        links, new_height = taken
+        fresh = [href for href in links if href not in seen]
+        seen.update(fresh)
+        yield from fresh
+        total += len(fresh)
+        if fresh or new_height != height:
+            quiet, height = 0, new_height
+            print(f"  ↳ {total} unique links so far")
+        else:
+            quiet += 1
+
+
+def product_url(href, base_url):
+    """Absolute product URL without query, fragment or ``/collections/<handle>`` prefix."""
+    parsed = urlparse(urljoin(base_url, href.strip()))
+    path = re.sub(r"^/collections/[^/]+(?=/products/)", "", parsed.path).rstrip("/")
+    return urlunparse(parsed._replace(path=path, params="", query="", fragment=""))
+
+
+def _fetch(url):
+    """``url`` parsed as a ``StaticPage``, or None if it cannot be fetched."""
+    from .static_page import StaticPage
+    page = StaticPage()
+    try:
+        retry.call(lambda: page.get(url), url)
+    except Exception as e:
+        print(f"  ⚠️ Could not load {url} ({e!r})")
+        return None
+    return page
+
+
+def _product_links(page, link_css):
+    if page is None:
+        return []
+    links = (a.get_attribute("href") for a in page.find_elements(By.CSS_SELECTOR, link_css))
+    return list(dict.fromkeys(product_url(href, page.current_url) for href in links if href and "/products/" in href))
+
+
+def _pagination(page):
+    """``(url_of(n), last_seen_n, next_url)`` from a listing page's pagination; parts may be None."""
+    base = page.current_url
+    numbered, next_url = {}, None
+    for el in page.find_elements(By.CSS_SELECTOR, _PAGE_LINK_CSS):
+        href = el.get_attribute("href") or el.get_attribute("data-url") or el.get_attribute("data-next-url")
+        if not href:
+            continue
+        href = urljoin(base, href)
+        if urlparse(href).netloc != urlparse(base).netloc:
+            continue
+        if next_url is None and "next" in (el.get_attribute("rel") or "").split():
+            next_url = href
+        match = _PAGE_NUMBER.search(href)
+        if match:
+            template = href[:match.start(2)] + "{}" + href[match.end(2):]
+            numbered.setdefault(template, set()).add(int(match.group(2)))
+    if not numbered:
+        return None, None, next_url
+    # The pattern most pagination links share, e.g. /collections/rings?page={}
+    template = max(numbered, key=lambda t: len(numbered[t]))
+    return template.format, max(numbered[template]), next_url
+
+
+def _numbered_pages(url_of, last, link_css, seen):
+    """Pages 2, 3... in concurrent batches; past ``last`` until a page adds nothing new."""
+    batch = max(1, config.COLLECTION_PAGE_CONCURRENCY)
+    with ThreadPoolExecutor(max_workers=batch) as pool:
+        number = 2
+        while True:
+            numbers = range(number, number + batch)
+            for n, page in zip(numbers, pool.map(lambda n: _fetch(url_of(n)), numbers)):
+                new = [u for u in _product_links(page, link_css) if u not in seen]
+                if not new and n > last:
+                    return  # past the end: an empty grid, or the last page served again
+                seen.update(new)
+                yield from new
+            number += batch
+
+
+def _next_pages(next_url, link_css, seen):
+    """Cursor-style pagination: follow ``rel=next`` one page after another."""
+    visited = set()
+    while next_url and next_url not in visited:
+        visited.add(next_url)
+        page = _fetch(next_url)
+        new = [u for u in _product_links(page, link_css) if u not in seen]
+        seen.update(new)
+        yield from new
+        next_url = _pagination(page)[2] if page is not None else None
+
+
+def crawl_collection(collection_url, link_css=PRODUCT_LINK_CSS, fallback=None):
+    """Yield the product URLs of every page of a collection, as the pages arrive.
+
+    ``fallback(collection_url)``, if given, produces the links instead when
+    the first page has none in its HTML (grid rendered by JavaScript) or
+    lxml is not installed.
+    """
+    try:
+        first = _fetch(collection_url)
+    except ImportError as e:
+        print(f"  ⚠️ Static collection crawl needs lxml and cssselect ({e})")
+        first = None
+    links = _product_links(first, link_css)
+    if not links:
+        if fallback is not None:
+            print("  ↳ No product links in the collection's HTML, using the browser")
+            yield from fallback(collection_url)
+        return
+    seen = set(links)
+    yield from links
+    url_of, last, next_url = _pagination(first)
+    if url_of is not None:
+        yield from _numbered_pages(url_of, last, link_css, seen)
+    elif next_url is not None:
+        yield from _next_pages(next_url, link_css, seen)
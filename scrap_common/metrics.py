@@ -0,0 +1,121 @@
+"""Timing spans and counters for every stage of a run.
+
+``span("page_load", url=...)`` times a block and appends one line to the run's JSONL
+trace (``<script>-<timestamp>.jsonl`` in ``config.METRICS_DIR``); ``count``
+bumps a counter. At exit the totals are written next to it as a
+Prometheus-style text file (``.prom``), so a slow run can be broken down into
+time spent in Chrome, on the network and in Pillow.
+"""
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from . import config
+
+_lock = threading.Lock()
+_trace = None
+_paths = None
+_spans = {}  # (name, labels) -> [count, total seconds, max seconds]
+_counters = {}  # (name, labels) -> value
+
+
+def _run_paths():
+    global _paths
+    if _paths is None:
+        script = os.path.splitext(os.path.basename(sys.argv[0] or "python"))[0] or "python"
+        prefix = os.path.join(config.METRICS_DIR, f"{script}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}")
+        _paths = prefix + ".jsonl", prefix + ".prom"
+        atexit.register(export)
+    return _paths
+
+
+def _write(record):
+    global _trace
+    if _trace is None:
+        trace_path = _run_paths()[0]
+        os.makedirs(os.path.dirname(trace_path), exist_ok=True)
+        _trace = open(trace_path, "a", encoding="utf-8")
+    _trace.write(json.dumps(record) + "\n")
+
+
+def observe(name, seconds, url=None, fields=None, **labels):
+    """Record an already measured span.
+
+    ``labels`` (a few distinct values, e.g. ``host``) split the totals;
+    ``url`` and ``fields`` (bytes, status, ...) only go to the trace.
+    """
+    if not config.METRICS:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        stats = _spans.setdefault(key, [0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += seconds
+        stats[2] = max(stats[2], seconds)
+        record = {"ts": round(time.time() - seconds, 3), "span": name, "seconds": round(seconds, 4),
+                  "thread": threading.current_thread().name, **labels, **(fields or {})}
+        if url is not None:
+            record["url"] = url
+        try:
+            _write(record)
+        except OSError:
+            pass
+
+
+@contextmanager
+def span(name, url=None, **labels):
+    """Time the block as ``name``; the yielded dict takes trace-only fields (bytes, status...)."""
+    fields = {}
+    started = time.monotonic()
+    try:
+        yield fields
+    except BaseException as e:
+        labels["error"] = e.__class__.__name__
+        raise
+    finally:
+        observe(name, time.monotonic() - started, url, fields, **labels)
+
+
+def count(name, value=1, **labels):
+    if not config.METRICS:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{str(v).replace(chr(34), chr(39))}"' for k, v in pairs) + "}"
+
+
+def export():
+    """Flush the trace and write the Prometheus text file (registered at exit)."""
+    global _trace
+    with _lock:
+        if _trace is not None:
+            _trace.close()
+            _trace = None
+        if not _spans and not _counters:
+            return
+        lines = []
+        for (name, labels), (n, total, longest) in sorted(_spans.items()):
+            metric = f"scrap_{name}_seconds"
+            lines.append(f"{metric}_count{_labels(labels)} {n}")
+            lines.append(f"{metric}_sum{_labels(labels)} {total:.4f}")
+            lines.append(f"{metric}_max{_labels(labels)} {longest:.4f}")
+        for (name, labels), value in sorted(_counters.items()):
+            lines.append(f"scrap_{name}_total{_labels(labels)} {value}")
+        trace_path, prom_path = _run_paths()
+    try:
+        os.makedirs(os.path.dirname(prom_path), exist_ok=True)
+        with open(prom_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        print(f"📊 Run metrics: {prom_path} (trace: {trace_path})")
+    except OSError as e:
+        print(f"⚠️ Could not write metrics: {e}")
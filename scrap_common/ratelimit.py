@@ -0,0 +1,144 @@
+"""Adaptive per-host request rate shared by page loads and image downloads.
+
+Every request first takes a token from its host's bucket (``acquire``), then
+reports how it went (``feedback``). Rates follow AIMD: each healthy response
+adds a little, while a 429/503, a failure or a latency spike well above the
+host's usual response time halves or trims it, and ``Retry-After`` pauses the
+host altogether. Page loads and image GETs have separate buckets, even on the
+same host (Shopify serves ``/cdn/shop/`` images from the storefront), so page
+pacing never throttles downloads: pages start at ``config.RATE_PAGE_START``
+and images at ``config.RATE_IMAGE_START`` req/s. What was learned is saved to
+``config.RATE_STATE`` so the next run starts at the right speed.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from urllib.parse import urlparse
+
+from . import config, http_cache, metrics
+
+INCREASE = 0.1  # req/s added per healthy response
+DECREASE = 0.5  # factor applied on 429/503 and failures
+SLOW_DECREASE = 0.8  # factor applied when latency spikes
+SLOW_FACTOR = 3  # latency this many times the usual, and at least SLOW_MARGIN s more, is a spike
+SLOW_MARGIN = 0.5
+COOLDOWN = 1.0  # s between two decreases, so one overload is not counted per in-flight request
+
+_hosts = {}  # (host, "pages" or "images") -> _Host
+_lock = threading.Lock()
+_saved_state = None
+
+
+class _Host:
+    def __init__(self, rate, latency=None):
+        self.rate = rate
+        self.latency = latency  # moving average of healthy response times
+        self.tokens = 1.0
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.last_decrease = 0.0
+
+    def reserve(self, now):
+        self.tokens = min(max(1.0, self.rate), self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1  # below zero the request queues behind earlier reservations
+        wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        return max(wait, self.blocked_until - now)
+
+    def decrease(self, factor, now):
+        if now - self.last_decrease >= COOLDOWN:
+            self.rate = max(config.RATE_MIN, self.rate * factor)
+            self.last_decrease = now
+
+
+def _load_state():
+    global _saved_state
+    if _saved_state is None:
+        try:
+            with open(config.RATE_STATE, encoding="utf-8") as f:
+                _saved_state = json.load(f)
+        except (OSError, ValueError):
+            _saved_state = {}
+        atexit.register(save_state)
+    return _saved_state
+
+
+def _key(url, page):
+    return urlparse(url).netloc, "pages" if page else "images"
+
+
+def _state_name(key):
+    return f"{key[0]} {key[1]}"
+
+
+def _host(url, page):
+    key = _key(url, page)
+    state = _hosts.get(key)
+    if state is None:
+        saved = _load_state().get(_state_name(key), {})
+        start_rate = config.RATE_PAGE_START if page else config.RATE_IMAGE_START
+        rate = min(config.RATE_MAX, max(config.RATE_MIN, saved.get("rate", start_rate)))
+        state = _hosts[key] = _Host(rate, saved.get("latency"))
+    return state
+
+
+def reserve(url, page=False):
+    """Take a token for ``url``'s host and kind; returns the seconds to wait before sending."""
+    if not config.RATE_LIMIT:
+        return 0.0
+    with _lock:
+        return _host(url, page).reserve(time.monotonic())
+
+
+def acquire(url, page=False):
+    """Block until a request to ``url``'s host is allowed."""
+    wait = reserve(url, page)
+    if wait > 0:
+        time.sleep(wait)
+        metrics.observe("rate_wait", wait, url, page=page)
+
+
+def feedback(url, status=None, latency=None, retry_after=None, failed=False, page=False):
+    """Adjust the host's page or image rate after a response (``status``/``latency`` s) or a ``failed`` request."""
+    if not config.RATE_LIMIT:
+        return
+    now = time.monotonic()
+    with _lock:
+        host = _hosts.get(_key(url, page))
+        if host is None:
+            return
+        if failed or status in (429, 503):
+            host.decrease(DECREASE, now)
+            pause = http_cache.retry_after(retry_after)
+            if pause:
+                host.blocked_until = max(host.blocked_until, now + pause)
+                print(f"    ⚠️ {urlparse(url).netloc} asked us to wait {pause:.0f}s")
+            return
+        if latency is not None:
+            usual = host.latency
+            # Spikes count towards the average too, so a lasting shift soon becomes the new usual
+            host.latency = latency if usual is None else 0.9 * usual + 0.1 * latency
+            if usual is not None and latency > max(SLOW_FACTOR * usual, usual + SLOW_MARGIN):
+                host.decrease(SLOW_DECREASE, now)
+                return
+        host.rate = min(config.RATE_MAX, host.rate + INCREASE)
+
+
+def save_state():
+    """Write the learned rates to ``config.RATE_STATE`` (also done at exit)."""
+    if not _hosts:
+        return
+    with _lock:
+        state = dict(_load_state())
+        for key, host in _hosts.items():
+            state[_state_name(key)] = {"rate": round(host.rate, 3), "latency": host.latency}
+    try:
+        os.makedirs(os.path.dirname(config.RATE_STATE), exist_ok=True)
+        tmp_path = config.RATE_STATE + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, config.RATE_STATE)
+    except OSError as e:
+        print(f"  ⚠️ Could not save request rates: {e}")
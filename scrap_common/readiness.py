@@ -0,0 +1,92 @@
+"""Event-driven page readiness waits used instead of fixed sleeps.
+
+Each wait polls a site-specific condition and returns as soon as it holds,
+with a hard upper bound so a slow or broken page never blocks a worker.
+"""
+import time
+
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+
+from . import config, metrics
+
+# True once at least `min` matching <img> carry a real (non-placeholder) source
+_IMAGES_READY_JS = """
+const imgs = document.querySelectorAll(arguments[0]);
+let ready = 0;
+for (const img of imgs) {
+    const src = img.currentSrc || img.getAttribute('src') || '';
+    const srcset = img.getAttribute('srcset') || img.getAttribute('data-srcset') || '';
+    const real = (s) => s && !s.startsWith('data:') && !/placeholder|blank|spacer/i.test(s);
+    if (real(srcset) || real(src)) ready++;
+}
+return ready >= arguments[1];
+"""
+
+_NETWORK_STATE_JS = """
+return [document.readyState, performance.getEntriesByType('resource').length];
+"""
+
+
+def element_present(css):
+    return lambda driver: driver.find_elements(By.CSS_SELECTOR, css)
+
+
+def images_ready(img_css, min_count=1):
+    return lambda driver: driver.execute_script(_IMAGES_READY_JS, img_css, min_count)
+
+
+def wait_until(driver, condition, timeout, poll=0.1):
+    """Poll ``condition(driver)`` until truthy; False if ``timeout`` ran out."""
+    if timeout <= 0:
+        return False
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=poll).until(condition)
+        return True
+    except TimeoutException:
+        return False
+
+
+def wait_network_idle(driver, timeout=None, window=None):
+    """Wait until the document is parsed and no new resource loaded for ``window`` s."""
+    timeout = config.NETWORK_IDLE_TIMEOUT if timeout is None else timeout
+    window = config.NETWORK_IDLE_WINDOW if window is None else window
+    deadline = time.monotonic() + timeout
+    last_count, quiet_since = -1, time.monotonic()
+    while time.monotonic() < deadline:
+        try:
+            state, count = driver.execute_script(_NETWORK_STATE_JS)
+        except Exception:
+            return False
+        now = time.monotonic()
+        if count != last_count:
+            last_count, quiet_since = count, now
+        elif state != "loading" and now - quiet_since >= window:
+            return True
+        time.sleep(0.1)
+    return False
+
+
+def wait_for_gallery(driver, gallery_css, img_css=None, timeout=None, network_idle=True):
+    """Wait for the product gallery to be usable; returns True if it became ready.
+
+    Waits for ``gallery_css`` to be present, then (if given) for ``img_css``
+    images to have a real src/srcset, then briefly for the network to settle.
+    The whole wait never exceeds ``timeout`` seconds.
+    """
+    if getattr(driver, "static", False):
+        return True  # server-rendered HTML is complete once fetched
+    timeout = config.READY_TIMEOUT if timeout is None else timeout
+    deadline = time.monotonic() + timeout
+    with metrics.span("readiness_wait") as fields:
+        ready = wait_until(driver, element_present(gallery_css), timeout)
+        if ready and img_css:
+            ready = wait_until(driver, images_ready(img_css), deadline - time.monotonic())
+        fields["ready"] = ready
+        if not ready:
+            print(f"    ⚠️ Gallery not ready after {timeout:.0f}s, extracting what is there")
+            return False
+        if network_idle:
+            wait_network_idle(driver, min(config.NETWORK_IDLE_TIMEOUT, max(0, deadline - time.monotonic())))
+    return True
@@ -0,0 +1,143 @@
+"""Pick the one image URL to download for an ``<img>``, at the size we want.
+
+Galleries expose the same picture in several sizes (``srcset`` candidates,
+Shopify ``_600x`` file suffixes, ``?width=`` parameters). ``image_url`` picks
+the candidate closest to ``config.IMAGE_WIDTH`` and, where the CDN can resize
+on the fly, rewrites the URL to exactly that width, so every image is fetched
+once at the right size instead of as a thumbnail or an oversized original.
+"""
+import re
+from urllib.parse import parse_qsl, urlencode, urljoin, urlparse, urlunparse
+
+from . import config
+
+SRCSET_ATTRS = ("srcset", "data-srcset")
+SRC_ATTRS = ("data-src", "data-lazy-src", "src")
+
+# Size suffix of legacy Shopify product image URLs: image_600x.jpg, image_600x800_crop_center@2x.jpg,
+# image_grande.jpg. Only stripped from legacy /products/ paths without ``width``, since on other
+# URLs the same endings (ring_small.jpg, band_4x6.jpg) are part of the uploaded file's name.
+_SHOPIFY_SIZE = re.compile(
+    r"_(?:\d+x\d*|x\d+|pico|icon|thumb|small|compact|medium|large|grande|original|master)"
+    r"(?:_crop_[a-z]+)?(?:@\dx)?(?=\.[A-Za-z0-9]+$)"
+)
+# Width placeholder of lazysizes-style templates: data-src="image_{width}x.jpg"
+_WIDTH_PLACEHOLDER = re.compile(r"\{width\}|%7Bwidth%7D", re.IGNORECASE)
+_DESCRIPTOR = re.compile(r"^(\d+(?:\.\d+)?)([wx])$")
+
+
+def parse_srcset(value):
+    """``[(url, width, density), ...]`` from a srcset; the unused descriptor is None."""
+    candidates = []
+    pos = 0
+    value = value or ""
+    while pos < len(value):
+        while pos < len(value) and (value[pos].isspace() or value[pos] == ","):
+            pos += 1
+        start = pos
+        while pos < len(value) and not value[pos].isspace():
+            pos += 1
+        url = value[start:pos]
+        descriptor = ""
+        if url.endswith(","):
+            url = url.rstrip(",")
+        else:
+            end = value.find(",", pos)
+            end = len(value) if end == -1 else end
+            descriptor = value[pos:end].strip()
+            pos = end + 1
+        if not url:
+            continue
+        width = density = None
+        match = _DESCRIPTOR.match(descriptor)
+        if match and match.group(2) == "w":
+            width = int(float(match.group(1)))
+        elif match:
+            density = float(match.group(1))
+        candidates.append((url, width, density))
+    return candidates
+
+
+def pick_candidate(candidates, target_width=None):
+    """URL of the smallest candidate at least ``target_width`` wide, else the largest."""
+    if not candidates:
+        return None
+    target_width = config.IMAGE_WIDTH if target_width is None else target_width
+    widths = [c for c in candidates if c[1]]
+    if widths:
+        widths.sort(key=lambda c: c[1])
+        if target_width:
+            for url, width, _ in widths:
+                if width >= target_width:
+                    return url
+        return widths[-1][0]
+    return max(candidates, key=lambda c: c[2] or 1)[0]
+
+
+def is_shopify_cdn(url):
+    parsed = urlparse(url)
+    return parsed.netloc == "cdn.shopify.com" or "/cdn/shop/" in parsed.path
+
+
+def sized_url(url, target_width=None):
+    """``url`` rewritten to ask the CDN for ``target_width`` px (0: the original).
+
+    Only Shopify CDN URLs and URLs already carrying a ``width`` parameter are
+    touched; anything else cannot be resized and is returned as is. File names
+    are left alone except for the size suffix of legacy Shopify product URLs.
+    """
+    target_width = config.IMAGE_WIDTH if target_width is None else target_width
+    parsed = urlparse(url)
+    query = parse_qsl(parsed.query, keep_blank_values=True)
+    if is_shopify_cdn(url):
+        path = parsed.path
+        if "/products/" in path and not any(k == "width" for k, _ in query):
+            path = _SHOPIFY_SIZE.sub("", path)
+        query = [(k, v) for k, v in query if k not in ("width", "height", "crop")]
+    elif any(k == "width" for k, _ in query):
+        path = parsed.path
+        query = [(k, v) for k, v in query if k != "width"]
+        if not target_width:
+            return url
+    else:
+        return url
+    if target_width:
+        query.append(("width", str(target_width)))
+    return urlunparse(parsed._replace(path=path, query=urlencode(query)))
+
+
+def absolute_url(url, base_url):
+    url = url.strip()
+    if url.startswith("//"):
+        return "https:" + url
+    return urljoin(base_url, url)
+
+
+def _fill_width(url, target_width):
+    """``url`` with a lazy-loader ``{width}`` placeholder filled in; None for ``data:`` URLs or an unfillable template."""
+    if not url or url.startswith("data:"):
+        return None
+    if _WIDTH_PLACEHOLDER.search(url):
+        if not target_width:
+            return None  # asked for the original, which a template cannot name
+        return _WIDTH_PLACEHOLDER.sub(str(target_width), url)
+    return url
+
+
+def image_url(attrs, base_url, target_width=None):
+    """Best absolute URL for an image from its ``srcset``/``src``-like attributes, or None.
+
+    Lazy-loading placeholders (``data:`` URIs) are skipped in favour of the
+    next attribute, so ``srcset="data:..." data-src="..."`` finds the real image.
+    """
+    width = config.IMAGE_WIDTH if target_width is None else target_width
+    for name in SRCSET_ATTRS:
+        candidates = [(_fill_width(url, width), w, d) for url, w, d in parse_srcset(attrs.get(name))]
+        url = pick_candidate([c for c in candidates if c[0]], target_width)
+        if url:
+            return sized_url(absolute_url(url, base_url), target_width)
+    for name in SRC_ATTRS:
+        url = _fill_width(attrs.get(name), width)
+        if url:
+            return sized_url(absolute_url(url, base_url), target_width)
+    return None
@@ -0,0 +1,169 @@
+"""Retries with backoff and per-host circuit breakers for page loads and image GETs.
+
+``call`` runs a request, retries it on transient errors (timeouts, dropped
+connections, 408/429/5xx) after an exponential, jittered backoff and gives up
+on anything else straight away. Each host has a breaker: after
+``config.BREAKER_FAILURES`` failures in a row it opens and requests fail fast
+with ``CircuitOpen`` for ``config.BREAKER_COOLDOWN`` s, then one trial request
+decides whether it closes again. Products that still fail are retried once
+the run is over (see ``workers.run_pool``).
+"""
+import asyncio
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from selenium.common.exceptions import TimeoutException, WebDriverException
+
+from . import config, metrics
+
+RETRY_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+# Chrome net errors worth another try
+_TRANSIENT_NET_ERRORS = ("ERR_CONNECTION", "ERR_TIMED_OUT", "ERR_NETWORK_CHANGED", "ERR_EMPTY_RESPONSE",
+                         "ERR_HTTP2", "ERR_NAME_NOT_RESOLVED", "ERR_INTERNET_DISCONNECTED")
+
+
+class CircuitOpen(Exception):
+    """Raised instead of sending a request to a host whose breaker is open."""
+
+
+def _status(error):
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None)
+
+
+def is_retryable(error):
+    if isinstance(error, CircuitOpen):
+        return False
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    if isinstance(error, requests.HTTPError):
+        return _status(error) in RETRY_STATUSES
+    if isinstance(error, TimeoutException):
+        return True
+    if isinstance(error, WebDriverException):
+        return any(code in (error.msg or "") for code in _TRANSIENT_NET_ERRORS)
+    try:
+        import httpx
+    except ImportError:
+        return False
+    if isinstance(error, httpx.TransportError):
+        return True
+    return isinstance(error, httpx.HTTPStatusError) and _status(error) in RETRY_STATUSES
+
+
+def backoff(attempt):
+    """Seconds to wait before retry number ``attempt`` (1-based): full jitter."""
+    return random.uniform(0, min(config.RETRY_BACKOFF_MAX, config.RETRY_BACKOFF * 2 ** (attempt - 1)))
+
+
+class _Breaker:
+    def __init__(self):
+        self.failures = 0
+        self.open_until = 0.0
+        self.trial = False
+
+    def allow(self, now):
+        if self.failures < config.BREAKER_FAILURES:
+            return True
+        if now < self.open_until or self.trial:
+            return False
+        self.trial = True  # half-open: one request finds out if the host is back
+        return True
+
+    def record(self, ok, now):
+        self.trial = False
+        if ok is None:
+            return  # the host answered, but a 404 or a parse error says nothing about its health
+        if ok:
+            self.failures = 0
+            return
+        self.failures += 1
+        if self.failures >= config.BREAKER_FAILURES:
+            self.open_until = now + config.BREAKER_COOLDOWN
+
+
+_breakers = {}
+_lock = threading.Lock()
+
+
+def _breaker(url):
+    host = urlparse(url).netloc
+    with _lock:
+        return _breakers.setdefault(host, _Breaker())
+
+
+def check(url):
+    """Raise ``CircuitOpen`` if requests to ``url``'s host are currently suspended."""
+    breaker = _breaker(url)
+    with _lock:
+        if not breaker.allow(time.monotonic()):
+            raise CircuitOpen(f"{urlparse(url).netloc} keeps failing, not retrying it for now")
+
+
+def record(url, ok):
+    """Count a success (``ok``) or failure towards ``url``'s breaker; ``None`` leaves it as it is."""
+    breaker = _breaker(url)
+    with _lock:
+        breaker.record(ok, time.monotonic())
+
+
+def cooldown_left(urls):
+    """Seconds until every open breaker among the hosts of ``urls`` allows a trial again."""
+    now = time.monotonic()
+    with _lock:
+        hosts = {urlparse(url).netloc for url in urls}
+        return max([b.open_until - now for h, b in _breakers.items() if h in hosts] + [0.0])
+
+
+def _should_retry(error, attempt, deadline):
+    if not is_retryable(error) or attempt >= config.RETRY_ATTEMPTS:
+        return None
+    wait = backoff(attempt)
+    if deadline is not None and time.monotonic() + wait >= deadline:
+        return None
+    return wait
+
+
+def call(fn, url, deadline=None):
+    """``fn()`` with retries on transient errors for ``url``; ``deadline`` is a ``time.monotonic()`` value."""
+    attempt = 0
+    while True:
+        attempt += 1
+        check(url)
+        try:
+            result = fn()
+        except Exception as e:
+            record(url, False if is_retryable(e) else None)
+            wait = _should_retry(e, attempt, deadline)
+            if wait is None:
+                raise
+            print(f"    ↻ Retrying {url} in {wait:.1f}s ({e.__class__.__name__})")
+            metrics.count("retries", error=e.__class__.__name__)
+            time.sleep(wait)
+            continue
+        record(url, True)
+        return result
+
+
+async def call_async(fn, url, deadline=None):
+    """``call`` for a coroutine function ``fn``."""
+    attempt = 0
+    while True:
+        attempt += 1
+        check(url)
+        try:
+            result = await fn()
+        except Exception as e:
+            record(url, False if is_retryable(e) else None)
+            wait = _should_retry(e, attempt, deadline)
+            if wait is None:
+                raise
+            print(f"    ↻ Retrying {url} in {wait:.1f}s ({e.__class__.__name__})")
+            metrics.count("retries", error=e.__class__.__name__)
+            await asyncio.sleep(wait)
+            continue
+        record(url, True)
+        return result
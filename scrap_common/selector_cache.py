@@ -0,0 +1,97 @@
+"""Per-host memory of which selector of a cascade finds what we want.
+
+Extractors that try a list of selectors in order (the PortLyons gallery
+cascade) find the same one winning on every product of a store. ``preferred``
+returns the selector that last won on the URL's host so the extractor can try
+it alone first; ``hit`` records a winner and ``miss`` a page where the learned
+selector found nothing. After ``config.SELECTOR_MISSES`` misses in a row the
+selector is demoted, and the next winner of the full cascade takes its place.
+What was learned is saved to ``config.SELECTOR_CACHE`` for the next run.
+"""
+import atexit
+import json
+import os
+import threading
+from urllib.parse import urlparse
+
+from . import config, metrics
+
+_learned = {}  # host -> {cascade name: {"selector": ..., "misses": ...}}
+_lock = threading.Lock()
+_loaded = False
+_dirty = False
+
+
+def _load():
+    global _loaded
+    if not _loaded:
+        try:
+            with open(config.SELECTOR_CACHE, encoding="utf-8") as f:
+                _learned.update(json.load(f))
+        except (OSError, ValueError):
+            pass
+        _loaded = True
+        atexit.register(save)
+
+
+def _entry(url, name):
+    return _learned.get(urlparse(url).netloc, {}).get(name)
+
+
+def preferred(url, name):
+    """The selector of cascade ``name`` that last won on ``url``'s host, or None."""
+    with _lock:
+        _load()
+        entry = _entry(url, name)
+    return entry["selector"] if entry else None
+
+
+def hit(url, name, selector):
+    """``selector`` found what cascade ``name`` looks for on ``url``; call it on every success.
+
+    A success of the learned selector clears its misses, so only
+    ``config.SELECTOR_MISSES`` misses in a row demote it.
+    """
+    global _dirty
+    with _lock:
+        _load()
+        entry = _entry(url, name)
+        if entry and entry["selector"] == selector:
+            if entry["misses"]:
+                entry["misses"] = 0
+                _dirty = True
+            return
+        if entry and entry["misses"] < config.SELECTOR_MISSES:
+            return  # one odd page does not unseat the host's usual selector
+        _learned.setdefault(urlparse(url).netloc, {})[name] = {"selector": selector, "misses": 0}
+        _dirty = True
+    metrics.count("selector_learned", cascade=name)
+
+
+def miss(url, name):
+    """The learned selector of cascade ``name`` found nothing on ``url``."""
+    global _dirty
+    with _lock:
+        entry = _entry(url, name)
+        if entry:
+            entry["misses"] += 1
+            _dirty = True
+    metrics.count("selector_misses", cascade=name)
+
+
+def save():
+    """Write the learned selectors to ``config.SELECTOR_CACHE`` (also done at exit)."""
+    global _dirty
+    with _lock:
+        if not _dirty:
+            return
+        state = json.loads(json.dumps(_learned))
+        _dirty = False
+    try:
+        os.makedirs(os.path.dirname(config.SELECTOR_CACHE), exist_ok=True)
+        tmp_path = config.SELECTOR_CACHE + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, config.SELECTOR_CACHE)
+    except OSError as e:
+        print(f"  ⚠️ Could not save learned selectors: {e}")
@@ -0,0 +1,114 @@
+"""Product discovery through Shopify's public JSON endpoints.
+
+``/collections/<handle>/products.json`` lists a collection 250 products per
+page (``/products.json`` the whole store, for its root URL only) and ``/products/<handle>.js`` gives a product's images in gallery order,
+requested at ``config.IMAGE_WIDTH`` (see ``resolver``). Every function returns ``None`` when the store does not
+answer these endpoints, so callers can fall back to the browser.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+from . import config, resolver, retry
+from .downloader import rate_limited_get
+
+PAGE_SIZE = 250
+
+
+def _store_root(url):
+    parsed = urlparse(url)
+    return f"{parsed.scheme}://{parsed.netloc}"
+
+
+def _handle_after(url, segment):
+    parts = [p for p in urlparse(url).path.split("/") if p]
+    if segment in parts and parts.index(segment) + 1 < len(parts):
+        return parts[parts.index(segment) + 1]
+    return None
+
+
+def _products_url(listing_url):
+    """The products.json listing ``listing_url``, or None if the page is neither a collection nor the store root."""
+    root = _store_root(listing_url)
+    handle = _handle_after(listing_url, "collections")
+    if handle:
+        return f"{root}/collections/{handle}/products.json"  # /collections/all lists the whole store too
+    if urlparse(listing_url).path.strip("/") == "":
+        return f"{root}/products.json"
+    return None  # /search, /pages/...: not what products.json would return
+
+
+def _get_json(url, **params):
+    try:
+        r = rate_limited_get(url, page=True, params=params, timeout=30)
+        if r.status_code != 200:
+            return None
+        return r.json()
+    except ValueError:  # HTML error page or password page instead of JSON
+        return None
+
+
+def _fetch_page(products_url, page):
+    """One page of products, ``[]`` past the end; raises ``LookupError`` if it cannot be had."""
+    def fetch():
+        r = rate_limited_get(products_url, page=True, params={"limit": PAGE_SIZE, "page": page}, timeout=30)
+        r.raise_for_status()
+        return r.json().get("products", [])
+    try:
+        return retry.call(fetch, f"{products_url}?page={page}")
+    except (OSError, ValueError, retry.CircuitOpen) as e:
+        # A missing page would silently truncate the listing, so it fails the whole listing
+        raise LookupError(f"page {page} of {products_url} is not available ({e!r})") from e
+
+
+def iter_products(listing_url):
+    """Yield raw product dicts for a collection URL (or the whole store).
+
+    Pages are requested ``SHOPIFY_PAGE_CONCURRENCY`` at a time until an empty
+    page shows the end of the listing. A page that still fails after
+    ``retry.call``'s retries raises ``LookupError``, whichever page it is,
+    as does a URL that is neither a collection nor the store root.
+    """
+    products_url = _products_url(listing_url)
+    if products_url is None:
+        raise LookupError(f"{listing_url} is not a collection")
+    batch = max(1, config.SHOPIFY_PAGE_CONCURRENCY)
+    with ThreadPoolExecutor(max_workers=batch) as pool:
+        page = 1
+        while True:
+            pages = pool.map(lambda p: _fetch_page(products_url, p), range(page, page + batch))
+            for products in pages:
+                if not products:
+                    return
+                yield from products
+            page += batch
+
+
+def get_collection_links(listing_url):
+    """Product URLs of a collection (or the store root), or None for other pages or if the API is unavailable."""
+    if not config.SHOPIFY_API or _products_url(listing_url) is None:
+        return None
+    root = _store_root(listing_url)
+    try:
+        links = [f"{root}/products/{p['handle']}" for p in iter_products(listing_url)]
+    except (LookupError, OSError) as e:
+        print(f"  ⚠️ Shopify products.json not usable ({e}), falling back to the browser.")
+        return None
+    # Keep first-seen order, a product may be returned twice across pages
+    return list(dict.fromkeys(links)) or None
+
+
+def get_product(product_url):
+    """Return ``(title, image_urls)`` from ``/products/<handle>.js``, or None."""
+    if not config.SHOPIFY_API:
+        return None
+    handle = _handle_after(product_url, "products")
+    if not handle:
+        return None
+    try:
+        data = _get_json(f"{_store_root(product_url)}/products/{handle}.js")
+    except OSError:
+        return None
+    if not data or not data.get("images"):
+        return None
+    images = [resolver.sized_url(resolver.absolute_url(src, product_url)) for src in data["images"] if src]
+    return data.get("title") or handle, list(dict.fromkeys(images))
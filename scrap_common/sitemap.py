@@ -0,0 +1,170 @@
+"""Incremental product discovery from a store's sitemaps.
+
+The sitemaps (``robots.txt``'s ``Sitemap:`` lines, else ``/sitemap.xml``) are
+streamed and parsed with ``iterparse`` one ``<url>`` at a time, following
+sitemap indexes into their product sitemaps (``sitemap_products_1.xml`` on
+Shopify). Each product's version is its ``<lastmod>`` (or, without one, a hash
+of its ``<image:loc>`` list) and is compared with the job's manifest from the
+previous run (JSON in ``config.SITEMAP_DIR``), so a daily run only visits the
+products that are new or changed since::
+
+    python Cullen_Diamonds/cullen_image_scrap.py --sitemap https://store.example [folder]
+"""
+import gzip
+import hashlib
+import json
+import os
+import sys
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+from urllib.parse import urljoin, urlparse
+
+from . import config, workers
+from .downloader import rate_limited_get
+
+Entry = namedtuple("Entry", "url lastmod images")
+
+
+def _local(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def _stream(url):
+    r = rate_limited_get(url, page=True, stream=True, timeout=60)
+    r.raise_for_status()
+    r.raw.decode_content = True
+    if urlparse(url).path.endswith(".gz"):
+        return r, gzip.GzipFile(fileobj=r.raw)
+    return r, r.raw
+
+
+def _parse(url):
+    """Yield ``("sitemap", loc)`` for index children and ``("url", Entry)`` for pages of one sitemap."""
+    r, body = _stream(url)
+    with r:
+        context = ET.iterparse(body, events=("start", "end"))
+        _, root = next(context)
+        for event, elem in context:
+            if event != "end":
+                continue
+            tag = _local(elem.tag)
+            if tag == "sitemap":
+                loc = elem.findtext("{*}loc")
+                if loc:
+                    yield "sitemap", loc.strip()
+            elif tag == "url":
+                loc = elem.findtext("{*}loc")
+                if loc:
+                    images = [i.findtext("{*}loc").strip() for i in elem if _local(i.tag) == "image" and i.findtext("{*}loc")]
+                    lastmod = (elem.findtext("{*}lastmod") or "").strip() or None
+                    yield "url", Entry(loc.strip(), lastmod, images)
+            else:
+                continue
+            root.clear()  # keep memory flat on sitemaps with thousands of URLs
+
+
+def sitemap_urls(site_url):
+    """The sitemaps a store announces in ``robots.txt``, else its ``/sitemap.xml``."""
+    root = f"{urlparse(site_url).scheme}://{urlparse(site_url).netloc}"
+    try:
+        r = rate_limited_get(urljoin(root, "/robots.txt"), page=True, timeout=30)
+        if r.status_code == 200:
+            found = [line.split(":", 1)[1].strip() for line in r.text.splitlines()
+                     if line.lower().startswith("sitemap:")]
+            if found:
+                return found
+    except OSError:
+        pass
+    return [urljoin(root, "/sitemap.xml")]
+
+
+def iter_entries(site_url, product_filter=None):
+    """Yield an ``Entry`` per product page listed in the store's sitemaps, as they are parsed.
+
+    In a sitemap index, only the children with "product" in their URL are
+    read when there are any. ``product_filter(url)`` can drop other pages.
+    """
+    pending, visited = sitemap_urls(site_url), set()
+    while pending:
+        url = pending.pop(0)
+        if url in visited:
+            continue
+        visited.add(url)
+        children = []
+        for kind, item in _parse(url):
+            if kind == "sitemap":
+                children.append(item)
+            elif product_filter is None or product_filter(item.url):
+                yield item
+        products = [c for c in children if "product" in c.lower()]
+        pending.extend(products or children)
+
+
+def _version(entry):
+    if entry.lastmod:
+        return entry.lastmod
+    if entry.images:
+        return "images:" + hashlib.sha1("\n".join(entry.images).encode()).hexdigest()
+    return None
+
+
+class Manifest:
+    """Product versions seen by a job's last run, to tell which products changed since."""
+
+    def __init__(self, name, path=None):
+        self.path = path or os.path.join(config.SITEMAP_DIR, f"{name}.json")
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                self.previous = json.load(f)
+        except (OSError, ValueError):
+            self.previous = {}
+        self.current = {}
+        self.queued = 0
+
+    def changed(self, entries):
+        """Yield the URLs of ``entries`` that are new or have a different version than last run."""
+        for entry in entries:
+            version = _version(entry)
+            self.current[entry.url] = version
+            if entry.url not in self.previous or (version is not None and version != self.previous[entry.url]):
+                self.queued += 1
+                yield entry.url
+
+    def save(self, failed=()):
+        """Remember this run's versions; ``failed`` products keep the old one so they are tried again.
+
+        Products not seen this time are kept too, so a sitemap that failed
+        half-way does not make the next run revisit everything.
+        """
+        versions = {**self.previous, **self.current}
+        for url in failed:
+            if url in self.previous:
+                versions[url] = self.previous[url]
+            else:
+                versions.pop(url, None)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(versions, f)
+        os.replace(tmp_path, self.path)
+
+
+def command_line():
+    """``(site_url, folder or None)`` when a script is run as ``script.py --sitemap SITE_URL [FOLDER]``."""
+    args = sys.argv[1:]
+    if len(args) < 2 or args[0] != "--sitemap":
+        return None
+    return args[1], args[2] if len(args) > 2 else None
+
+
+def run_changed(job_journal, site_url, root_folder, process_product, make_driver, fast_path=None, product_filter=None):
+    """Scrape only the products of ``site_url``'s sitemaps that changed since the job's last run."""
+    manifest = Manifest(job_journal.name)
+    os.makedirs(root_folder, exist_ok=True)
+    job_journal.start([], root_folder)
+    print(f"Reading the sitemaps of {site_url}, only new or changed products are scraped...")
+    failed = workers.run_pool(manifest.changed(iter_entries(site_url, product_filter)), process_product, make_driver,
+                              fast_path=fast_path, journal=job_journal)
+    manifest.save(failed)
+    print(f"  ✔ {len(manifest.current)} products in the sitemaps, {manifest.queued} new or changed")
+    return failed
@@ -0,0 +1,80 @@
+"""Static-HTML stand-in for a Selenium WebDriver.
+
+``StaticPage`` fetches a page with the shared pooled HTTP session and parses
+it with lxml, exposing the subset of the WebDriver/WebElement API our
+extractors use (``get``, ``find_element(s)``, ``get_attribute``, ``text``).
+That way the exact same selector logic runs on server-rendered HTML, and a
+browser is only started when the static parse finds no gallery.
+"""
+from urllib.parse import urljoin
+
+import lxml.html
+from selenium.common.exceptions import NoSuchElementException
+from selenium.webdriver.common.by import By
+
+from .downloader import rate_limited_get
+
+# Attributes a browser reports as absolute URLs (DOM properties)
+_URL_ATTRIBUTES = {"src", "href"}
+
+
+class StaticElement:
+    def __init__(self, node, base_url):
+        self._node = node
+        self._base_url = base_url
+
+    def find_elements(self, by=By.CSS_SELECTOR, value=None):
+        if by == By.TAG_NAME:
+            nodes = self._node.iterdescendants(value)
+        elif by == By.CSS_SELECTOR:
+            # cssselect matches descendant-or-self; WebDriver only searches descendants
+            nodes = (n for n in self._node.cssselect(value) if n is not self._node)
+        else:
+            raise ValueError(f"Unsupported locator for static pages: {by}")
+        return [StaticElement(n, self._base_url) for n in nodes]
+
+    def find_element(self, by=By.CSS_SELECTOR, value=None):
+        found = self.find_elements(by, value)
+        if not found:
+            raise NoSuchElementException(f"No element matches {value!r} in static HTML")
+        return found[0]
+
+    def get_attribute(self, name):
+        value = self._node.get(name)
+        if value is not None and name in _URL_ATTRIBUTES:
+            return urljoin(self._base_url, value.strip())
+        return value
+
+    @property
+    def text(self):
+        return " ".join(self._node.text_content().split())
+
+
+class StaticPage(StaticElement):
+    """Drop-in for the driver argument of the site extractors."""
+
+    static = True
+
+    def __init__(self, timeout=30):
+        super().__init__(lxml.html.fromstring("<html></html>"), "")
+        self.timeout = timeout
+        self.current_url = None
+        self.page_source = ""
+
+    def set_page_load_timeout(self, timeout):
+        self.timeout = timeout
+
+    def get(self, url):
+        r = rate_limited_get(url, page=True, timeout=self.timeout)
+        r.raise_for_status()
+        self.current_url = r.url
+        self.page_source = r.text
+        self._node = lxml.html.fromstring(r.content, base_url=r.url)
+        self._base_url = r.url
+
+    def quit(self):
+        pass
+
+
+def is_static(driver):
+    return getattr(driver, "static", False)
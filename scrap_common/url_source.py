@@ -0,0 +1,48 @@
+"""Product URLs read from a file or stdin instead of typed at a prompt.
+
+A line may hold one URL, several comma-separated URLs (the format of the
+``links.txt`` that ``Malaniecasey_get_link.py`` saves) or a JSON record with a
+``url`` field (JSONL). Lines are used as soon as they are read, so a link
+collector can be piped straight into a scraper::
+
+    python Melaniecasey/Malaniecasey_get_link.py URL | python Melaniecasey/Malaniecasey_pipeline.py --urls -
+"""
+import json
+import sys
+
+
+def parse_line(line):
+    """The http(s) URLs on one line of input (anything else is ignored)."""
+    line = line.strip()
+    if line.startswith("{"):
+        try:
+            record = json.loads(line)
+        except ValueError:
+            return []
+        url = record.get("url") if isinstance(record, dict) else None
+        urls = [url] if isinstance(url, str) else []
+    else:
+        urls = line.split(",")
+    return [u.strip() for u in urls if u.strip().lower().startswith(("http://", "https://"))]
+
+
+def iter_urls(source):
+    """Yield each new URL of ``source`` (a path, or ``"-"`` for stdin) as it is read."""
+    stream = sys.stdin if source == "-" else open(source, encoding="utf-8")
+    seen = set()
+    try:
+        for line in stream:
+            for url in parse_line(line):
+                if url not in seen:
+                    seen.add(url)
+                    yield url
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+def emit(url, stream=None):
+    """Write ``url`` as a JSONL record and flush it, for the next stage of a pipe."""
+    stream = stream or sys.stdout
+    stream.write(json.dumps({"url": url}) + "\n")
+    stream.flush()
@@ -0,0 +1,391 @@
+"""Pool of WebDriver workers sharing one queue of product URLs.
+
+Each worker thread owns its own Chrome instance, loads product pages and runs
+the site's extraction on them. Extraction returns a download job (a callable)
+which is handed to a separate download stage so the browser can move on to
+the next page straight away. A crashed browser only affects its own worker:
+the driver is relaunched and the product is retried once on the new driver.
+
+Before a browser is involved, a site may supply a ``fast_path`` (e.g. the
+Shopify JSON API) and, with ``SCRAP_STATIC_FIRST=1``, each product is tried on
+its server-rendered HTML (see ``static_page``). Chrome is only launched,
+lazily, for products where those find nothing to download.
+
+Once browsers are in use, ``config.WARM_DRIVERS`` spares are kept launched in
+the background, so replacing a browser costs no startup time. A worker
+replaces its browser when it has served ``config.RECYCLE_PAGES`` pages, grown
+past ``config.RECYCLE_RSS_MB`` or keeps failing, rather than on a fixed count.
+Products that fail are retried at the end of the run (``config.RETRY_ROUNDS``).
+
+The URLs may also be streamed (a generator fed by link discovery or a URL
+file): they pass through a queue of ``config.PIPELINE_QUEUE`` entries, so
+product pages are rendered while links are still being found and the
+finished products download in the background, three stages overlapping.
+"""
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from selenium.common.exceptions import WebDriverException
+
+from . import capture, config, metrics, ratelimit, retry
+from .journal import product_context
+
+
+def _driver_alive(driver):
+    try:
+        driver.current_url
+        return True
+    except Exception:
+        return False
+
+
+def _quit(driver):
+    try:
+        driver.quit()
+    except Exception:
+        pass
+
+
+def _launch(make_driver, name):
+    for attempt in range(1, config.DRIVER_RESTARTS + 1):
+        try:
+            return make_driver()
+        except BaseException as e:  # get_driver() may call exit() on failure
+            print(f"  [{name}] ⚠️ Could not start browser (attempt {attempt}): {e!r}")
+            time.sleep(attempt)
+    return None
+
+
+def _browser_rss_mb(driver):
+    """Memory of chromedriver and its Chrome processes, or None if it can't be measured."""
+    try:
+        import psutil
+        root = psutil.Process(driver.service.process.pid)
+        return sum(p.memory_info().rss for p in [root] + root.children(recursive=True)) / 2 ** 20
+    except Exception:  # psutil missing, no service (remote driver), processes gone
+        return None
+
+
+class _Health:
+    """Page count and recent failures of one browser."""
+
+    def __init__(self):
+        self.pages = 0
+        self.recent = deque(maxlen=10)
+
+    def record(self, ok):
+        self.pages += 1
+        self.recent.append(ok)
+
+    def recycle_reason(self, driver):
+        if config.RECYCLE_PAGES and self.pages >= config.RECYCLE_PAGES:
+            return f"{self.pages} pages served"
+        if (config.RECYCLE_ERROR_RATE and len(self.recent) == self.recent.maxlen
+                and self.recent.count(False) / len(self.recent) >= config.RECYCLE_ERROR_RATE):
+            return f"{self.recent.count(False)} of its last {len(self.recent)} pages failed"
+        if config.RECYCLE_RSS_MB:
+            rss = _browser_rss_mb(driver)
+            if rss is not None and rss > config.RECYCLE_RSS_MB:
+                return f"using {rss:.0f} MB"
+        return None
+
+
+class _Spares:
+    """Browsers launched in the background, handed out instead of launching on demand."""
+
+    def __init__(self, make_driver, count):
+        self.make_driver = make_driver
+        self.count = max(0, count)
+        self.ready = queue.Queue()
+        self.lock = threading.Lock()
+        self.launching = []
+        self.closed = False
+
+    def _launch_one(self):
+        try:
+            driver = self.make_driver()
+        except BaseException as e:
+            print(f"  ⚠️ Could not start a spare browser: {e!r}")
+            return
+        with self.lock:
+            closed = self.closed
+        if closed:
+            _quit(driver)
+        else:
+            self.ready.put(driver)
+
+    def _fill(self):
+        with self.lock:
+            self.launching = [t for t in self.launching if t.is_alive()]
+            missing = self.count - self.ready.qsize() - len(self.launching)
+            if self.closed or missing <= 0:
+                return
+            for _ in range(missing):
+                t = threading.Thread(target=self._launch_one, daemon=True)
+                t.start()
+                self.launching.append(t)
+
+    def get(self, name):
+        """A warm browser if one is ready, else one launched now (None if Chrome won't start)."""
+        try:
+            driver = self.ready.get_nowait()
+        except queue.Empty:
+            driver = None
+        if driver is not None and not _driver_alive(driver):
+            _quit(driver)
+            driver = None
+        if driver is None:
+            driver = _launch(self.make_driver, name)
+        self._fill()
+        return driver
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            launching = list(self.launching)
+        for t in launching:
+            t.join()
+        while not self.ready.empty():
+            _quit(self.ready.get_nowait())
+
+
+def _static_page():
+    if not config.STATIC_FIRST:
+        return None
+    try:
+        from .static_page import StaticPage
+    except ImportError as e:
+        print(f"  ⚠️ Static fast path needs lxml and cssselect ({e}), using Chrome only.")
+        return None
+    return StaticPage()
+
+
+def _try_without_browser(fast_path, static, process_product, url):
+    if fast_path is not None:
+        try:
+            job = fast_path(url)
+            if job is not None:
+                return job
+        except Exception as e:
+            print(f"    ↳ Fast path failed ({e!r})")
+    if static is None:
+        return None
+    try:
+        job = process_product(static, url)
+    except Exception as e:
+        print(f"    ↳ Static fetch failed ({e!r}), using the browser")
+        return None
+    if job is None:
+        print("    ↳ Nothing found in static HTML, using the browser")
+    return job
+
+
+class _NoBrowser(Exception):
+    pass
+
+
+def run_pool(product_urls, process_product, make_driver, workers=None, fast_path=None, journal=None):
+    """Process ``product_urls`` with ``workers`` browsers in parallel.
+
+    ``product_urls`` is a list, or any iterable consumed as it yields (see
+    the module docstring); repeated URLs of a stream are only processed once.
+    ``process_product(driver, url)`` loads and extracts one product and returns
+    a zero-argument download job, or ``None`` when there is nothing to download.
+    Page loads are paced per host by ``ratelimit`` rather than fixed pauses and
+    retried on transient errors by ``retry``.
+    ``fast_path(url)``, if given, is tried first and returns a download job
+    or ``None`` to fall back to the browser.
+    ``journal`` (a ``journal.Journal``) records each product's progress.
+    Products that failed (or, with a journal, lost images) are queued and
+    retried for ``config.RETRY_ROUNDS`` more passes once the others are done.
+    Returns the list of URLs that could not be processed.
+    """
+    spares = _Spares(make_driver, config.WARM_DRIVERS)
+    try:
+        failed = _run_round(product_urls, process_product, spares, workers, fast_path, journal)
+        for round_no in range(1, config.RETRY_ROUNDS + 1):
+            if not failed:
+                break
+            wait = retry.cooldown_left(failed)
+            print(f"\n↻ Retry round {round_no}: {len(failed)} failed products"
+                  + (f", after waiting {wait:.0f}s for failing hosts" if wait else ""))
+            time.sleep(wait)
+            failed = _run_round(failed, process_product, spares, workers, fast_path, journal)
+    finally:
+        spares.close()
+    if failed:
+        print(f"\n⚠️ {len(failed)} products failed:")
+        for url in failed:
+            print(f"   {url}")
+    return failed
+
+
+def _run_round(product_urls, process_product, spares, workers, fast_path, journal):
+    """One pass of ``run_pool`` over ``product_urls``; returns the URLs that failed."""
+    streamed = not isinstance(product_urls, (list, tuple))
+    if streamed:
+        workers = max(1, workers or config.BROWSER_WORKERS)
+        todo = queue.Queue(maxsize=max(1, config.PIPELINE_QUEUE))
+        total = "?"
+    else:
+        workers = max(1, min(workers or config.BROWSER_WORKERS, len(product_urls) or 1))
+        todo = queue.Queue()
+        total = len(product_urls)
+    fed = threading.Event()  # set once every URL is in the queue
+    failed = []
+    failed_lock = threading.Lock()
+    running = []
+
+    def mark_failed(url, error=None):
+        with failed_lock:
+            failed.append(url)
+        if journal is not None and error is not None:
+            journal.product_failed(url, error)
+
+    def download(job, url):
+        started = time.monotonic()
+        try:
+            with metrics.span("product_download", url=url):
+                if journal is None:
+                    job()
+                    return
+                with product_context(journal, url):
+                    job()
+            if not journal.product_downloaded(url, time.monotonic() - started):
+                mark_failed(url)  # some images failed: worth another pass
+        except Exception as e:
+            print(f"  ✘ Download stage failed for {url}: {e!r}")
+            mark_failed(url, repr(e))
+        finally:
+            capture.release(url)
+
+    def worker(name, downloads):
+        driver = None
+        health = None
+        static = _static_page()
+
+        def in_browser(url):
+            nonlocal driver, health
+            for attempt in (1, 2):
+                if driver is None:
+                    driver = spares.get(name)
+                    health = _Health()
+                    if driver is None:
+                        raise _NoBrowser("could not start the browser")
+                ratelimit.acquire(url, page=True)
+                started = time.monotonic()
+                try:
+                    job = process_product(driver, url)
+                    health.record(True)
+                    # Page load plus extraction: a slowing store shows up here before it starts refusing
+                    ratelimit.feedback(url, latency=time.monotonic() - started, page=True)
+                    return job
+                except WebDriverException:
+                    health.record(False)
+                    ratelimit.feedback(url, failed=True, page=True)
+                    if attempt == 2 or _driver_alive(driver):
+                        raise
+                    print(f"  [{name}] ⚠️ Browser died, restarting it...")
+                    _quit(driver)
+                    driver = None
+
+        def maybe_recycle():
+            nonlocal driver
+            reason = health.recycle_reason(driver) if driver is not None else None
+            if reason:
+                print(f"  [{name}] ♻️ Replacing browser ({reason})")
+                metrics.count("browser_recycles")
+                _quit(driver)
+                driver = None
+
+        try:
+            while True:
+                try:
+                    position, url = todo.get(timeout=0.5)
+                except queue.Empty:
+                    if fed.is_set() and todo.empty():
+                        return
+                    continue
+                print(f"\n[{position}/{total}] ({name}) Processing: {url}")
+                started = time.monotonic()
+                if journal is not None:
+                    journal.product_started(url)
+                try:
+                    with metrics.span("product_page", url=url), capture.product(url):
+                        job = _try_without_browser(fast_path, static, process_product, url)
+                        if job is None:
+                            job = retry.call(lambda: in_browser(url), url, started + config.PRODUCT_DEADLINE)
+                except _NoBrowser as e:
+                    capture.release(url)
+                    mark_failed(url, str(e))
+                    metrics.count("products", result="failed")
+                    return  # other workers take over the queue
+                except Exception as e:
+                    error = e.msg if isinstance(e, WebDriverException) else repr(e)
+                    print(f"  [{name}] ✘ Error processing {url}: {error}")
+                    capture.release(url)
+                    mark_failed(url, error)
+                    metrics.count("products", result="failed")
+                else:
+                    metrics.count("products", result="extracted" if job is not None else "no_images")
+                    if job is not None:
+                        if journal is not None:
+                            journal.product_page_done(url, time.monotonic() - started)
+                        downloads.submit(download, job, url)
+                    else:
+                        capture.release(url)
+                        if journal is not None:
+                            journal.product_failed(url, "no images found")
+                maybe_recycle()
+        finally:
+            if driver is not None:
+                _quit(driver)
+
+    def feed():
+        seen = set()
+        # A resumed stream rediscovers products the interrupted run already downloaded
+        done = journal.downloaded_urls() if streamed and journal is not None else set()
+        try:
+            for url in product_urls:
+                if url in seen or url in done:
+                    continue
+                seen.add(url)
+                if streamed and journal is not None:
+                    journal.add_product(url, len(seen))
+                while True:
+                    if not any(t.is_alive() for t in running):
+                        mark_failed(url, "no browser available")
+                        return  # every worker gave up, stop pulling links
+                    try:
+                        todo.put((len(seen), url), timeout=1)
+                        break
+                    except queue.Full:
+                        continue
+            if streamed and journal is not None:
+                journal.discovery_finished()
+        except Exception as e:
+            print(f"  ✘ Product URL source failed: {e!r}")
+        finally:
+            fed.set()
+
+    with ThreadPoolExecutor(max_workers=max(1, config.DOWNLOAD_STAGE_WORKERS)) as downloads:
+        running.extend(
+            threading.Thread(target=worker, args=(f"w{n}", downloads), daemon=True)
+            for n in range(1, workers + 1)
+        )
+        for t in running:
+            t.start()
+        try:
+            feed()  # in this thread, so Ctrl+C still reaches a scrolling link collector
+        finally:
+            fed.set()
+        for t in running:
+            t.join()
+
+    # Workers that could not start a browser leave their URLs in the queue
+    while not todo.empty():
+        mark_failed(todo.get_nowait()[1], "no browser available")
+    return failed